@@ -1,11 +1,17 @@
 from dataclasses import dataclass
 from enum import Enum, auto
-from typing import Dict, Any, List, Tuple, NamedTuple, Optional
-from collections import defaultdict
+from typing import Callable, Dict, Any, List, Tuple, NamedTuple, Optional
 from operator import attrgetter
+import time
 import numpy as np
 from scipy.stats import randint
 
+from algorithms.construction import Construction, nearest_neighbour_tour
+from algorithms.local_search import LocalSearch
+from algorithms.shared import WorkerPool, worker_arrays
+from algorithms.stopping import StoppingCriteria
+from tsp import Recorder
+
 
 class AntColony:
     class Variation(Enum):
@@ -25,9 +31,17 @@ class AntColony:
         iterations: int = 100
         infinity: float = 1e9  # Initial value pheromone value for max min ant system.
         p_best: float = 0.05  # Probability of the best solution being taken at convergence for max min ant system.
+        batched: bool = True  # Move all ants one step at a time with array operations instead of one by one.
+        candidates: int = 0  # Number of nearest cities an ant chooses from, 0 to consider every city.
+        workers: int = 1  # Number of processes building the tours of batched ants.
+        seed: Optional[int] = None  # Seed of the random streams, None for an unpredictable run.
+        local_search: Optional[LocalSearch] = None  # Improvement of tours before pheromones are deposited.
+        improve_all: bool = False  # Improve every ant's tour instead of only the iteration best one.
+        stopping: Optional[StoppingCriteria] = None  # Conditions to return before all iterations are run.
+        construction: Optional[Construction] = None  # Heuristic tour setting the initial pheromones and best solution.
 
     class Trail(NamedTuple):
-        path: List[Any]
+        path: List[int]  # visited cities, the first one repeated at the end
         distance: float
 
     def __init__(self, variation: Variation = Variation.ANT_SYSTEM,
@@ -39,41 +53,216 @@ class AntColony:
         self.min_pheromones = 0.0
         self.max_pheromones = self.settings.infinity
 
-        initial_pheromones = 1e-6
+        self.initial_pheromones = 1e-6
         if self.variation == AntColony.Variation.MAXMIN_ANT_SYSTEM:
-            initial_pheromones = self.max_pheromones
-
-        # Map from edges to amount of pheromone. Edges are given as state tuples.
-        self.pheromones: Dict[Any, float] = defaultdict(lambda: initial_pheromones)
+            self.initial_pheromones = self.max_pheromones
+
+        # Amount of pheromone on every edge, indexed by (from city, to city), is
+        # pheromone_scale * pheromones. Evaporation only shrinks the scale, so an
+        # update costs as much as the edges it deposits on. Allocated in solve()
+        # once the number of cities is known.
+        self.pheromones: np.ndarray = np.empty((0, 0))
+        self.pheromone_scale = 1.0
+        # Below this scale pheromones are rescaled before pheromones ** alpha overflows.
+        self.min_pheromone_scale = pow(10.0, -100 / max(self.settings.alpha, 1))
+        # Edges deposited on during the current update.
+        self.deposited: List[Tuple[np.ndarray, np.ndarray]] = []
+
+        # Heuristic desirability (1 / distance) ** beta of every edge, fixed for a solve.
+        self.heuristic: np.ndarray = np.empty((0, 0))
+        # Desirability pheromones ** alpha * heuristic of every edge, refreshed after
+        # every deposit. It leaves out the factor pheromone_scale ** alpha, which is
+        # the same for every edge and does not change the probabilities.
+        self.choice_info: np.ndarray = np.empty((0, 0))
+
+        # Nearest neighbour candidate lists, one row of city indices per city.
+        self.neighbours: Optional[np.ndarray] = None
+
+        # Random streams, one per solve and one per chunk of ants built by a worker.
+        self.seed_sequence = np.random.SeedSequence(self.settings.seed)
+        self.random = np.random.default_rng(self.seed_sequence)
+        self.pool: Optional[WorkerPool] = None
+
+        # Why the last solve returned and how many iterations it ran.
+        self.stop_reason = StoppingCriteria.Reason.ITERATIONS
+        self.iterations_done = 0
+
+        # Seconds spent building tours and improving them during the last solve.
+        self.timings: Dict[str, float] = {'construction': 0.0, 'local_search': 0.0}
 
         self.best_solution = AntColony.Trail([], float('inf'))
 
-    def _generate_solution(self, initial_state, successors_fn, goal_fn) -> Trail:
-        """Walk an ant through the graph, returning the path and the distance."""
-        path = [initial_state]
-        distance = 0.0
+        # Number of ants of the current solve and where its results are recorded.
+        self.ants = self.settings.ants
+        self.recorder: Optional[Recorder] = None
 
-        while not goal_fn(path[-1], initial_state):
-            successors: List[Tuple[Any, float]] = successors_fn(path[-1], initial_state)
+    def _generate_solution(self, tsp, start: int, visited: np.ndarray) -> Trail:
+        """Walk an ant through the graph, returning the path and the distance.
 
-            desirability = [
-                pow(self.pheromones[(path[-1], next_state)],
-                    self.settings.alpha) *
-                pow(1 / dist, self.settings.beta)
-                for next_state, dist in successors]
+        visited is a boolean buffer over cities reused between ants.
+        """
+        visited[:] = False
+        visited[start] = True
+        path = [start]
+        distance = 0.0
+        floor = self._choice_floor()
+
+        for _ in range(tsp.cities_amount - 1):
+            current = path[-1]
+            successors = None
+            if self.neighbours is not None:
+                # Scan every unvisited city only once all candidates are used.
+                candidates = self.neighbours[current]
+                successors = candidates[~visited[candidates]]
+            if successors is None or len(successors) == 0:
+                successors, _ = tsp.unvisited(current, visited)
+
+            desirability = self.choice_info[current, successors]
+            if floor > 0:
+                desirability = np.maximum(desirability, floor * self.heuristic[current, successors])
 
             # Normalize desirability.
-            total = sum(desirability)
-            desirability = [d / total for d in desirability]
+            total = desirability.sum()
+            if total > 0:
+                desirability = desirability / total
+            else:
+                desirability = np.full(len(successors), 1 / len(successors))
+
+            successor = int(self.random.choice(successors, p=desirability))
 
-            successor = np.random.choice(range(len(successors)), p=desirability)
-            next_state, dist = successors[successor]
+            visited[successor] = True
+            path.append(successor)
+            distance += float(tsp.dist(current, successor))
 
-            path.append(next_state)
-            distance += dist
+        path.append(start)
+        distance += float(tsp.dist(path[-2], start))
 
         return AntColony.Trail(path, distance)
 
+    def _generate_solutions(self, tsp, ants_position: np.ndarray) -> List[Trail]:
+        """Walk the whole colony through the graph in lockstep.
+
+        Every step each ant picks its next city by a roulette draw over the
+        desirability of its unvisited cities, the draws of all ants being done
+        at once. With several workers the ants are split between the processes
+        of the pool. Trails are the same as the ones of _generate_solution.
+        """
+        floor = self._choice_floor()
+        if self.pool is None:
+            tours = construct_tours(self.choice_info, self.neighbours, ants_position, self.random,
+                                    self.heuristic, floor)
+            distances = tour_lengths(tsp.dists(), tours)
+        else:
+            chunks = np.array_split(ants_position, self.settings.workers)
+            seeds = self.seed_sequence.spawn(len(chunks))
+            results = self.pool.starmap(_construct_chunk, zip(chunks, seeds, [floor] * len(chunks)))
+            tours = np.concatenate([chunk_tours for chunk_tours, _ in results])
+            distances = np.concatenate([chunk_distances for _, chunk_distances in results])
+
+        return [self._trail(tour, distance) for tour, distance in zip(tours.tolist(), distances)]
+
+    @staticmethod
+    def _trail(tour: List[int], distance: float) -> Trail:
+        """Make a closed trail from a tour given as a list of cities."""
+        return AntColony.Trail(tour + tour[:1], distance)
+
+    def _improve(self, tsp, trails: List[Trail]) -> List[Trail]:
+        """Run the local search on the iteration best trail or on every trail."""
+        if self.settings.improve_all:
+            indices = range(len(trails))
+        else:
+            indices = [min(range(len(trails)), key=lambda i: trails[i].distance)]
+
+        trails = list(trails)
+        for i in indices:
+            tour = np.array(trails[i].path[:-1])
+            delta = self.settings.local_search.improve(tour, tsp.dists())
+            if delta < 0:
+                trails[i] = self._trail(tour.tolist(), trails[i].distance + delta)
+
+        return trails
+
+    @staticmethod
+    def _nearest_neighbours(tsp, k: int) -> Optional[np.ndarray]:
+        """Return the k closest cities of every city, or None when lists are disabled."""
+        if k <= 0 or k >= tsp.cities_amount - 1:
+            return None
+        return tsp.nearest_neighbours(k)
+
+    def _heuristic(self, dists: np.ndarray) -> np.ndarray:
+        """Return (1 / distance) ** beta for every edge.
+
+        Loops get zero desirability, distinct cities at zero distance get the
+        desirability of the closest pair of distinct cities.
+        """
+        dists = np.array(dists, dtype=float)
+        np.fill_diagonal(dists, np.inf)
+        duplicates = dists <= 0
+        if np.any(duplicates):
+            dists[duplicates] = dists[~duplicates].min()
+        return np.power(1 / dists, self.settings.beta)
+
+    def _update_choice_info(self, edges: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> None:
+        """Recompute the desirability of the given edges, or of every edge, after pheromones changed."""
+        if edges is None:
+            np.power(self.pheromones, self.settings.alpha, out=self.choice_info)
+            self.choice_info *= self.heuristic
+        else:
+            self.choice_info[edges] = np.power(self.pheromones[edges], self.settings.alpha) * self.heuristic[edges]
+
+    def _choice_floor(self) -> float:
+        """Lower bound of choice_info in units of heuristic.
+
+        Evaporation does not touch the stored pheromones, so the lower limit of
+        the max min ant system is applied when desirability is read.
+        """
+        if self.variation != AntColony.Variation.MAXMIN_ANT_SYSTEM:
+            return 0.0
+        return pow(self.min_pheromones / self.pheromone_scale, self.settings.alpha)
+
+    def _rescale(self) -> None:
+        """Fold pheromone_scale into the stored pheromones.
+
+        Done when the scale underflows or the limits of the max min ant system
+        shrink, both are rare, so the whole-matrix cost is amortised.
+        """
+        self.pheromones *= self.pheromone_scale
+        self.pheromone_scale = 1.0
+
+        if self.variation == AntColony.Variation.MAXMIN_ANT_SYSTEM:
+            np.clip(self.pheromones, self.min_pheromones, self.max_pheromones, out=self.pheromones)
+
+        self._update_choice_info()
+
+    def _initial_level(self, distance: float) -> float:
+        """Initial pheromone of every edge given the length of a heuristic tour.
+
+        Levels of Dorigo and Stuetzle, Ant Colony Optimization (2004): about the
+        pheromone a variation deposits on an edge per iteration, before evaporation
+        balances it, so no tour is favoured from the start.
+        """
+        rho, q = self.settings.rho, self.settings.Q
+        if self.variation == AntColony.Variation.ELITIST_ANT_SYSTEM:
+            return q * (self.settings.elitist + self.ants) / (rho * distance)
+        if self.variation == AntColony.Variation.RANKBASED_ANT_SYSTEM:
+            return q * 0.5 * self.settings.elitist * (self.settings.elitist - 1) / (rho * distance)
+        return q * self.ants / distance
+
+    def _update_bounds(self, trail: Optional[Trail] = None) -> None:
+        """Update pheromone limits of the max min ant system from the best solution or the given trail."""
+        path, distance = trail if trail is not None else self.best_solution
+        old_max_pheromones = self.max_pheromones
+
+        n_root = pow(self.settings.p_best, 1 / len(path))
+        avg = len(path) / 2
+        self.max_pheromones = 1 / (1 - self.settings.rho) * self.settings.Q / distance
+        self.min_pheromones = self.max_pheromones * (1 - n_root) / (avg - 1) / n_root
+
+        # The lower limit is applied when pheromones are read, a lowered upper
+        # limit has to be applied to every edge.
+        if self.max_pheromones < old_max_pheromones:
+            self._rescale()
+
     def _deposit_pheromones(self, trail, is_elitist: bool = False,
                             rank: Optional[int] = None) -> None:
         """Deposit pheromones along the path. """
@@ -86,12 +275,22 @@ class AntColony:
         if self.variation == AntColony.Variation.RANKBASED_ANT_SYSTEM and rank is not None:
             amount *= self.settings.elitist - rank
 
-        for i in range(len(path) - 1):
-            edge = (path[i], path[i + 1])
-            self.pheromones[edge] += amount / distance
+        # The problem is symmetric, so both directions of an edge are reinforced.
+        nodes = np.array(path)
+        edges = (np.concatenate([nodes[:-1], nodes[1:]]), np.concatenate([nodes[1:], nodes[:-1]]))
 
-            if self.variation == AntColony.Variation.MAXMIN_ANT_SYSTEM:
-                self.pheromones[edge] = float(np.clip(self.pheromones[edge], self.min_pheromones, self.max_pheromones))
+        if self.variation == AntColony.Variation.MAXMIN_ANT_SYSTEM:
+            # Evaporated pheromones below the lower limit count as the limit.
+            self.pheromones[edges] = np.maximum(self.pheromones[edges],
+                                                self.min_pheromones / self.pheromone_scale)
+
+        np.add.at(self.pheromones, edges, amount / distance / self.pheromone_scale)
+
+        if self.variation == AntColony.Variation.MAXMIN_ANT_SYSTEM:
+            self.pheromones[edges] = np.minimum(self.pheromones[edges],
+                                                self.max_pheromones / self.pheromone_scale)
+
+        self.deposited.append(edges)
 
     def _update_pheromones(self, trails: List[Trail]) -> None:
         """Update pheromones based on trails.
@@ -101,11 +300,11 @@ class AntColony:
         the inverse length of the path.
         """
         # Pheromones evaporates at the rate of rho per iteration
-        for edge in self.pheromones:
-            self.pheromones[edge] *= (1 - self.settings.rho)
+        self.pheromone_scale *= (1 - self.settings.rho)
+        if self.pheromone_scale < self.min_pheromone_scale:
+            self._rescale()
 
-            if self.variation == AntColony.Variation.MAXMIN_ANT_SYSTEM:
-                self.pheromones[edge] = float(np.clip(self.pheromones[edge], self.min_pheromones, self.max_pheromones))
+        self.deposited = []
 
         # Pheromones deposit.
         if self.variation == self.Variation.ANT_SYSTEM:
@@ -132,55 +331,277 @@ class AntColony:
             for r in range(self.settings.elitist):
                 self._deposit_pheromones(sorted_trails[r], rank=r)
 
-    def solve(self, tsp, logging=False) -> float:
-        """Function finds the best path and saves the necessary info to the task class
+        self._update_deposited()
+
+    def branching_factor(self, lam: float = 0.05) -> float:
+        """Average lambda-branching factor of the pheromone matrix.
 
-        from tsp class ACO uses successors_fn, goal_fn, add_to_history_fn, add_iteration_fn
-        and State subclass
+        For every city count the edges whose pheromone is at least
+        lam of the way from the city's smallest to its largest value. Values
+        close to 2 mean the colony has converged to a single tour.
         """
-        n_cities = tsp.cities_amount
-        if self.settings.ants == 0:
-            self.settings.ants = n_cities
+        # The scale is common to all edges and does not change the counts.
+        pheromones = self.pheromones.copy()
+        np.fill_diagonal(pheromones, np.nan)
 
-        self.best_solution = AntColony.Trail([], float('inf'))
+        if self.variation == AntColony.Variation.MAXMIN_ANT_SYSTEM:
+            # Pheromones of the max min ant system are measured against its limits.
+            lowest = self.min_pheromones / self.pheromone_scale
+            highest = self.max_pheromones / self.pheromone_scale
+        else:
+            lowest = np.nanmin(pheromones, axis=1, keepdims=True)
+            highest = np.nanmax(pheromones, axis=1, keepdims=True)
+
+        branches = pheromones >= lowest + lam * (highest - lowest)
+        return float(np.count_nonzero(branches) / len(pheromones))
+
+    def _update_deposited(self) -> None:
+        """Refresh choice_info on the edges deposited on since the last refresh."""
+        if self.deposited:
+            self._update_choice_info((np.concatenate([rows for rows, _ in self.deposited]),
+                                      np.concatenate([columns for _, columns in self.deposited])))
+        self.deposited = []
+
+    def reinforce(self, trail: Trail) -> None:
+        """Deposit pheromones along a trail found outside the colony, e.g. by another colony.
+
+        The trail is deposited as an elitist one and replaces the best solution
+        if it is shorter.
+        """
+        if trail.distance < self.best_solution.distance:
+            self.best_solution = trail
+            if self.variation == self.Variation.MAXMIN_ANT_SYSTEM:
+                self._update_bounds()
+
+        self._deposit_pheromones(trail, is_elitist=True)
+        self._update_deposited()
+
+    def solve(self, tsp, logging=False, recorder: Optional[Recorder] = None,
+              on_iteration: Optional[Callable[[int], None]] = None) -> float:
+        """Function finds the best path and saves the necessary info to the recorder
+
+        from tsp class ACO uses unvisited and dists, results go to the given
+        recorder or to the default recorder of the tsp. on_iteration is called
+        with the number of iterations done after each of them, before the
+        stopping criteria are checked.
+        """
+        self.recorder = recorder if recorder is not None else tsp.recorder
+        stopping = self.settings.stopping
+        monitor = stopping.monitor() if stopping is not None else None
+        self.stop_reason = StoppingCriteria.Reason.ITERATIONS
+        self.iterations_done = 0
+
+        try:
+            self._prepare(tsp)
+            for _ in range(self.settings.iterations):
+                self._iteration(tsp, logging)
+                self.iterations_done += 1
+                if on_iteration is not None:
+                    on_iteration(self.iterations_done)
+
+                if monitor is not None:
+                    branching = self.branching_factor(stopping.branching_lambda) if stopping.branching > 0 else None
+                    reason = monitor.check(self.best_solution.distance, branching)
+                    if reason is not None:
+                        self.stop_reason = reason
+                        break
+        finally:
+            self._release()
 
-        for _ in range(self.settings.iterations):
-            trails: List[AntColony.Trail] = []
-            best_iteration_trail = AntColony.Trail([], float('inf'))
+        if logging:
+            self.recorder.add_ant_distance(self.iterations_done, self.ants)
 
-            ants_position = randint.rvs(0, n_cities, size=self.settings.ants)
+        self.recorder.solution = self.best_solution.distance
+        return self.best_solution.distance
 
-            for ant in range(self.settings.ants):
-                ant_state = ants_position[ant]
-                trail = self._generate_solution(tsp.State(1 << int(ant_state), ant_state), tsp.successors, tsp.goal)
-                trails.append(trail)
+    def _prepare(self, tsp) -> None:
+        """Reset the colony for a new solve and start its workers."""
+        n_cities = tsp.cities_amount
+        self.ants = self.settings.ants if self.settings.ants > 0 else n_cities
+        self.pool = None
 
-                if logging:
-                    tsp.add_ant_distance(trail.distance)
+        self.best_solution = AntColony.Trail([], float('inf'))
+        self.timings = {'construction': 0.0, 'local_search': 0.0}
+        self.seed_sequence = np.random.SeedSequence(self.settings.seed)
+        self.random = np.random.default_rng(self.seed_sequence.spawn(1)[0])
+        self.min_pheromones = 0.0
+        self.max_pheromones = self.settings.infinity
+        self.pheromones = np.full((n_cities, n_cities), self.initial_pheromones)
+        self.pheromone_scale = 1.0
+
+        self.neighbours = self._nearest_neighbours(tsp, self.settings.candidates)
+        self.heuristic = self._heuristic(tsp.dists())
+
+        self.choice_info = np.empty((n_cities, n_cities))
+
+        if self.settings.construction is not None:
+            # Only the length of the heuristic tour is used, to set the initial pheromones.
+            # Instances without coordinates get a nearest neighbour tour from the matrix.
+            if tsp.coordinates is None:
+                tour = nearest_neighbour_tour(np.asarray(tsp.dists()), int(self.random.integers(n_cities)))
+            else:
+                tour = self.settings.construction.tour(tsp.coordinates, self.random)
+            distance = float(tsp.path_lengths(tour))
+            if self.variation == AntColony.Variation.MAXMIN_ANT_SYSTEM:
+                # Pheromones start at the upper limit derived from the tour.
+                self._update_bounds(self._trail(tour.tolist(), distance))
+            else:
+                self.pheromones.fill(self._initial_level(distance))
+
+        self._update_choice_info()
+
+        # Workers are started last, so that nothing fails after they hold resources.
+        if self.settings.batched and self.settings.workers > 1:
+            # Workers read distances and desirability from shared memory, so only
+            # the starting cities and the tours travel between processes.
+            self.pool = WorkerPool(self.settings.workers,
+                                   {'dists': np.asarray(tsp.dists(), dtype=float), 'heuristic': self.heuristic,
+                                    'choice_info': self.choice_info},
+                                   {'neighbours': self.neighbours})
+            self.choice_info = self.pool.array('choice_info')
+
+    def _release(self) -> None:
+        """Stop the workers and free the shared memory of the last solve, also of a partly prepared one."""
+        if self.pool is not None:
+            self.choice_info = self.choice_info.copy()
+            self.pool.close()
+            self.pool = None
+
+    def _iteration(self, tsp, logging: bool) -> None:
+        """Build, improve and deposit the tours of one iteration."""
+        n_cities = tsp.cities_amount
+        best_iteration_trail = AntColony.Trail([], float('inf'))
 
-                if trail.distance < best_iteration_trail.distance:
-                    best_iteration_trail = trail
+        ants_position = randint.rvs(0, n_cities, size=self.ants, random_state=self.random)
 
-                    # Update bounds for max min ant system.
-                    if self.variation == self.Variation.MAXMIN_ANT_SYSTEM:
-                        n_root = pow(self.settings.p_best, 1 / len(trail.path))
-                        avg = len(trail.path) / 2
-                        self.max_pheromones = 1 / (1 - self.settings.rho) * self.settings.Q / trail.distance
-                        self.min_pheromones = self.max_pheromones * (1 - n_root) / (avg - 1) / n_root
+        start = time.perf_counter()
 
-            if logging:
-                tsp.add_iteration(best_iteration_trail.distance)
+        if self.settings.batched:
+            trails = self._generate_solutions(tsp, ants_position)
+        else:
+            visited = np.zeros(n_cities, dtype=bool)
+            trails = [self._generate_solution(tsp, int(start), visited) for start in ants_position]
+        self.timings['construction'] += time.perf_counter() - start
 
-            if best_iteration_trail.distance < self.best_solution.distance:
-                self.best_solution = best_iteration_trail
+        # Daemon action: improved tours are the ones depositing pheromones.
+        if self.settings.local_search is not None:
+            start = time.perf_counter()
+            trails = self._improve(tsp, trails)
+            self.timings['local_search'] += time.perf_counter() - start
 
+        for trail in trails:
             if logging:
-                tsp.add_to_history(self.best_solution.path, self.best_solution.distance)
+                self.recorder.add_ant_distance(trail.distance)
 
-            self._update_pheromones(trails)
+            if trail.distance < best_iteration_trail.distance:
+                best_iteration_trail = trail
 
         if logging:
-            tsp.add_ant_distance(self.settings.iterations, self.settings.ants)
+            self.recorder.add_iteration(best_iteration_trail.distance)
 
-        tsp.solution = self.best_solution.distance
-        return self.best_solution.distance
+        if best_iteration_trail.distance < self.best_solution.distance:
+            self.best_solution = best_iteration_trail
+
+            # Update bounds for max min ant system.
+            if self.variation == self.Variation.MAXMIN_ANT_SYSTEM:
+                self._update_bounds()
+
+        if logging:
+            self.recorder.add_to_history(self.best_solution.path, self.best_solution.distance)
+
+        self._update_pheromones(trails)
+
+def _transition_weights(choice_info: np.ndarray, current: np.ndarray, cities: np.ndarray,
+                        unvisited: np.ndarray, heuristic: Optional[np.ndarray] = None,
+                        floor: float = 0.0) -> np.ndarray:
+    """Desirability of moving from every current city to the given cities.
+
+    cities is broadcast against current[:, None] and unvisited holds one row
+    per current city. Visited cities get zero weight, the others at least
+    floor * heuristic.
+    """
+    desirability = choice_info[current[:, None], cities]
+    if floor > 0:
+        desirability = np.maximum(desirability, floor * heuristic[current[:, None], cities])
+    allowed = unvisited[np.arange(len(current))[:, None], cities]
+    return np.where(allowed, desirability, 0.0)
+
+
+def _roulette(weights: np.ndarray, random: np.random.Generator) -> np.ndarray:
+    """Draw one column per row with probability proportional to its weight.
+
+    The draw of every row is found by comparing a scaled uniform number
+    with the cumulative weights. Rows without positive weight get -1.
+    """
+    cumulative = np.cumsum(weights, axis=1)
+    total = cumulative[:, -1]
+    draws = random.random(len(weights)) * total
+    choice = np.count_nonzero(cumulative <= draws[:, None], axis=1)
+
+    # Rounding may push the draw past the last city.
+    overflow = choice == weights.shape[1]
+    choice[overflow] = np.argmax(weights[overflow], axis=1)
+    choice[total <= 0] = -1
+    return choice
+
+
+def construct_tours(choice_info: np.ndarray, neighbours: Optional[np.ndarray],
+                    ants_position: np.ndarray, random: np.random.Generator,
+                    heuristic: Optional[np.ndarray] = None, floor: float = 0.0) -> np.ndarray:
+    """Build the tours of all ants at once, one row of cities per ant.
+
+    With candidate lists an ant chooses among its unvisited neighbours and
+    scans every city only when all of them are visited. A positive floor
+    bounds desirability from below by floor * heuristic.
+    """
+    n_cities = len(choice_info)
+    ants = len(ants_position)
+    rows = np.arange(ants)
+    all_cities = np.arange(n_cities)[None, :]
+
+    tours = np.empty((ants, n_cities), dtype=int)
+    tours[:, 0] = ants_position
+    unvisited = np.ones((ants, n_cities), dtype=bool)
+    unvisited[rows, ants_position] = False
+
+    for step in range(1, n_cities):
+        current = tours[:, step - 1]
+        successors = np.full(ants, -1)
+
+        if neighbours is not None:
+            candidates = neighbours[current]
+            weights = _transition_weights(choice_info, current, candidates, unvisited, heuristic, floor)
+            choice = _roulette(weights, random)
+            chosen = choice >= 0
+            successors[chosen] = candidates[chosen, choice[chosen]]
+
+        # Ants without an unvisited candidate scan every city.
+        stuck = rows[successors < 0]
+        if len(stuck) > 0:
+            weights = _transition_weights(choice_info, current[stuck], all_cities, unvisited[stuck],
+                                          heuristic, floor)
+            choice = _roulette(weights, random)
+            underflow = choice < 0
+            if np.any(underflow):
+                # Desirability underflowed, every unvisited city is equally likely.
+                choice[underflow] = _roulette(unvisited[stuck[underflow]].astype(float), random)
+            successors[stuck] = choice
+
+        tours[:, step] = successors
+        unvisited[rows, successors] = False
+
+    return tours
+
+
+def tour_lengths(dists: np.ndarray, tours: np.ndarray) -> np.ndarray:
+    """Length of every closed tour given as a row of cities."""
+    return dists[tours, np.roll(tours, -1, axis=1)].sum(axis=1, dtype=float)
+
+
+def _construct_chunk(ants_position: np.ndarray, seed: np.random.SeedSequence,
+                     floor: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Build the tours of a part of the colony inside a worker process."""
+    tours = construct_tours(worker_arrays['choice_info'].array, worker_arrays['neighbours'],
+                            ants_position, np.random.default_rng(seed),
+                            worker_arrays['heuristic'].array, floor)
+    return tours, tour_lengths(worker_arrays['dists'].array, tours)
@@ -0,0 +1,349 @@
+from multiprocessing import Pool, Value
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+import heapq
+import time
+import numpy as np
+
+from algorithms.construction import nearest_neighbour_tour
+from algorithms.local_search import TwoOptOrOpt
+from tsp import Recorder
+
+
+class BranchAndBound:
+    """Exact solver searching a tree of edge inclusions and exclusions.
+
+    Every node is bounded from below by the Held-Karp 1-tree bound: a
+    spanning tree of cities 1..n-1 plus the two cheapest edges of city 0,
+    under edge costs c(i, j) + pi(i) + pi(j) whose multipliers pi are raised
+    by subgradient optimisation. Nodes inherit the multipliers of their
+    parent. A node whose bound reaches the incumbent tour is pruned. A node
+    whose 1-tree is a tour gives a new incumbent. Otherwise the search
+    branches on an edge at a city of degree more than two: one child
+    excludes the edge, the other includes it.
+
+    The top of the tree is expanded best first. With several workers its
+    open nodes are then split between the processes of a pool, which search
+    them depth first and share the incumbent length.
+    """
+    class Trail(NamedTuple):
+        path: List[int]  # visited cities, the first one repeated at the end
+        distance: float
+
+    class Node(NamedTuple):
+        bound: float
+        included: Tuple[Tuple[int, int], ...]
+        excluded: Tuple[Tuple[int, int], ...]
+        pi: np.ndarray
+
+    def __init__(self, workers: int = 1, time_limit: float = 0.0,
+                 root_iterations: int = 1000, node_iterations: int = 50):
+        self.workers = workers
+        self.time_limit = time_limit  # Seconds of search, 0 to search until optimality is proven.
+        self.root_iterations = root_iterations  # Subgradient steps at the root.
+        self.node_iterations = node_iterations  # Subgradient steps at other nodes.
+
+        self.best_solution = BranchAndBound.Trail([], float('inf'))
+        # Explored nodes and the proven lower bound of the last solve.
+        self.nodes = 0
+        self.lower_bound = 0.0
+
+    @property
+    def gap(self) -> float:
+        """Relative difference between the best tour and the lower bound, 0 once optimality is proven."""
+        if self.best_solution.distance in (0, float('inf')):
+            return 0.0
+        return max(self.best_solution.distance - self.lower_bound, 0.0) / self.best_solution.distance
+
+    def solve(self, tsp, logging=False, recorder: Optional[Recorder] = None,
+              initial_tour: Optional[Sequence[int]] = None) -> float:
+        """Find the shortest tour starting from the initial one, return its length.
+
+        Without an initial tour the incumbent is a nearest neighbour tour
+        improved by 2-opt and Or-opt.
+        """
+        recorder = recorder if recorder is not None else tsp.recorder
+        dists = np.asarray(tsp.dists(), dtype=float)
+        n = len(dists)
+
+        if initial_tour is None:
+            tour = nearest_neighbour_tour(dists)
+            TwoOptOrOpt().improve(tour, dists)
+            initial_tour = tour.tolist()
+        tour = list(initial_tour)
+        if len(tour) > n:
+            tour = tour[:n]
+        length = _tour_length(dists, tour)
+
+        incumbent = Value('d', length)
+        search = _Search(dists, incumbent, self.node_iterations,
+                         time.time() + self.time_limit if self.time_limit > 0 else None)
+        self.nodes = 0
+
+        best_tour, best_length = tour, length
+        open_bounds: List[float] = []
+        if n >= 4:
+            root = search.evaluate((), (), np.zeros(n), self.root_iterations, lam=2.0, patience=max(n // 2, 10))
+            frontier = [] if root.node is None else [(root.node, root.tree)]
+            if self.workers > 1:
+                frontier = search.best_first(frontier, 4 * self.workers)
+            self.nodes = search.explored
+            if search.best is not None and search.best[1] < best_length:
+                best_tour, best_length = search.best
+
+            if self.workers > 1 and frontier:
+                tasks = [frontier[i::self.workers] for i in range(self.workers)]
+                with Pool(self.workers, _attach_worker,
+                          (dists, incumbent, self.node_iterations, search.deadline)) as pool:
+                    results = pool.map(_search_subtrees, tasks)
+            else:
+                results = [search.depth_first(frontier)]
+
+            for found, explored, bounds in results:
+                self.nodes += explored
+                open_bounds.extend(bounds)
+                if found is not None and found[1] < best_length:
+                    best_tour, best_length = found
+
+        start = best_tour.index(0) if 0 in best_tour else 0
+        best_tour = best_tour[start:] + best_tour[:start]
+        self.best_solution = BranchAndBound.Trail(best_tour + best_tour[:1], best_length)
+        self.lower_bound = min(open_bounds + [best_length])
+
+        if logging:
+            recorder.add_iteration(best_length)
+            recorder.add_to_history(self.best_solution.path, best_length)
+
+        recorder.solution = best_length
+        return best_length
+
+
+class _Evaluation(NamedTuple):
+    node: Optional[BranchAndBound.Node]  # node to branch on, None when pruned or solved
+    tour: Optional[List[int]]  # tour found as a 1-tree
+    tree: Optional[np.ndarray]  # edges of the best 1-tree, one per row
+
+
+class _Search:
+    """Bounding and branching shared by the main process and the workers."""
+    def __init__(self, dists: np.ndarray, incumbent, node_iterations: int, deadline: Optional[float]):
+        self.dists = dists.copy()
+        np.fill_diagonal(self.dists, np.inf)
+        self.n = len(dists)
+        self.incumbent = incumbent
+        self.node_iterations = node_iterations
+        self.deadline = deadline
+        self.best: Optional[Tuple[List[int], float]] = None
+        self.explored = 0
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.time() > self.deadline
+
+    def improve(self, tour: List[int]) -> Tuple[List[int], float]:
+        """Offer a tour as the incumbent, return the best tour known to this search."""
+        length = _tour_length(self.dists, tour)
+        with self.incumbent.get_lock():
+            if length < self.incumbent.value:
+                self.incumbent.value = length
+        if self.best is None or length < self.best[1]:
+            self.best = (tour, length)
+        return self.best
+
+    def pruned(self, bound: float) -> bool:
+        return bound >= self.incumbent.value * (1 - 1e-12)
+
+    def evaluate(self, included, excluded, pi: np.ndarray, iterations: int,
+                 lam: float = 1.0, patience: int = 5) -> _Evaluation:
+        """Raise the 1-tree bound of a node by subgradient steps.
+
+        The step factor lam halves whenever the bound did not improve for
+        patience steps, the search ends when it gets negligible.
+        """
+        self.explored += 1
+        costs = self.dists.copy()
+        for i, j in excluded:
+            costs[i, j] = costs[j, i] = np.inf
+        forced = np.zeros_like(costs, dtype=bool)
+        for i, j in included:
+            forced[i, j] = forced[j, i] = True
+
+        pi = pi.copy()
+        best_bound, best_pi, best_tree = -np.inf, pi, None
+        stalled = 0
+        for _ in range(iterations):
+            weights = costs + pi[:, None] + pi[None, :]
+            tree = _one_tree(np.where(forced, -np.inf, weights))
+            if tree is None:
+                return _Evaluation(None, None, None)
+
+            bound = float(weights[tree[:, 0], tree[:, 1]].sum() - 2 * pi.sum())
+            degrees = np.bincount(tree.ravel(), minlength=self.n)
+            if bound > best_bound:
+                best_bound, best_pi, best_tree = bound, pi.copy(), tree
+                stalled = 0
+            else:
+                stalled += 1
+                if stalled >= patience:
+                    lam /= 2
+                    stalled = 0
+
+            if self.pruned(best_bound):
+                return _Evaluation(None, None, None)
+            if np.all(degrees == 2):
+                tour = _tree_tour(tree, self.n)
+                self.improve(tour)
+                return _Evaluation(None, tour, tree)
+
+            subgradient = degrees - 2
+            step = lam * (self.incumbent.value - bound) / float(np.dot(subgradient, subgradient))
+            pi = pi + step * subgradient
+            if lam < 1e-6:
+                break
+
+        return _Evaluation(BranchAndBound.Node(best_bound, included, excluded, best_pi), None, best_tree)
+
+    def children(self, node: BranchAndBound.Node, tree: np.ndarray) -> List[Tuple[BranchAndBound.Node, np.ndarray]]:
+        """Evaluate the two children of a node, return the ones left to search with their 1-trees."""
+        degrees = np.bincount(tree.ravel(), minlength=self.n)
+        fixed = set(node.included) | set(node.excluded)
+        city = int(np.argmax(degrees))
+        edges = [(min(i, j), max(i, j)) for i, j in tree.tolist() if city in (i, j)]
+        free = [edge for edge in edges if edge not in fixed]
+        if not free:
+            return []
+        edge = max(free, key=lambda e: self.dists[e])
+
+        children = []
+        for included, excluded in ((node.included, node.excluded + (edge,)),
+                                   (node.included + (edge,), node.excluded)):
+            constrained = _propagate(included, excluded, self.n)
+            if constrained is None:
+                continue
+            evaluation = self.evaluate(*constrained, node.pi, self.node_iterations)
+            if evaluation.node is not None:
+                children.append((evaluation.node, evaluation.tree))
+        return children
+
+    def best_first(self, frontier, wanted: int):
+        """Expand the nodes of the lowest bound until wanted nodes are open, return the open nodes."""
+        heap = [(node.bound, k, node, tree) for k, (node, tree) in enumerate(frontier)]
+        heapq.heapify(heap)
+        pushed = len(heap)
+        while heap and len(heap) < wanted and not self.expired():
+            _, _, node, tree = heapq.heappop(heap)
+            if self.pruned(node.bound):
+                continue
+            for child, child_tree in self.children(node, tree):
+                heapq.heappush(heap, (child.bound, pushed, child, child_tree))
+                pushed += 1
+        return [(node, tree) for _, _, node, tree in sorted(heap, key=lambda item: item[:2])]
+
+    def depth_first(self, frontier) -> Tuple[Optional[Tuple[List[int], float]], int, List[float]]:
+        """Search the subtrees of the nodes, return the best tour, explored nodes and bounds left open."""
+        self.explored = 0
+        stack = list(reversed(frontier))
+        while stack:
+            if self.expired():
+                return self.best, self.explored, [node.bound for node, _ in stack if not self.pruned(node.bound)]
+            node, tree = stack.pop()
+            if self.pruned(node.bound):
+                continue
+            # The child with the lower bound is searched first.
+            stack.extend(sorted(self.children(node, tree), key=lambda item: -item[0].bound))
+
+        return self.best, self.explored, []
+
+
+def _one_tree(weights: np.ndarray) -> Optional[np.ndarray]:
+    """Minimum 1-tree as an array of edges, None if the graph is disconnected.
+
+    Edges of weight -inf are forced into the tree, those of weight inf are missing.
+    """
+    n = len(weights)
+    edges = np.empty((n, 2), dtype=np.int64)
+
+    # Spanning tree of cities 1..n-1 by Prim's algorithm.
+    used = np.zeros(n, dtype=bool)
+    used[:2] = True
+    key = weights[1].copy()
+    key[used] = np.inf
+    parent = np.ones(n, dtype=np.int64)
+    for k in range(n - 2):
+        city = int(np.argmin(key))
+        if key[city] == np.inf:
+            return None
+        edges[k] = parent[city], city
+        used[city] = True
+        key[city] = np.inf
+        closer = (weights[city] < key) & ~used
+        key[closer] = weights[city][closer]
+        parent[closer] = city
+
+    # City 0 joins by its two cheapest edges.
+    nearest = np.argpartition(weights[0, 1:], 1)[:2] + 1
+    if np.any(weights[0, nearest] == np.inf):
+        return None
+    edges[n - 2] = 0, nearest[0]
+    edges[n - 1] = 0, nearest[1]
+    return edges
+
+
+def _tree_tour(tree: np.ndarray, n: int) -> List[int]:
+    """Tour formed by a 1-tree in which every city has degree two."""
+    adjacent: List[List[int]] = [[] for _ in range(n)]
+    for i, j in tree.tolist():
+        adjacent[i].append(j)
+        adjacent[j].append(i)
+    tour, previous = [0], -1
+    while len(tour) < n:
+        following = adjacent[tour[-1]][0] if adjacent[tour[-1]][0] != previous else adjacent[tour[-1]][1]
+        previous = tour[-1]
+        tour.append(following)
+    return tour
+
+
+def _propagate(included, excluded, n: int):
+    """Exclude the other edges of cities with two included edges, None if the constraints admit no tour."""
+    degree = [0] * n
+    parent = list(range(n))
+
+    def root(city: int) -> int:
+        while parent[city] != city:
+            parent[city] = parent[parent[city]]
+            city = parent[city]
+        return city
+
+    for i, j in included:
+        degree[i] += 1
+        degree[j] += 1
+        if degree[i] > 2 or degree[j] > 2:
+            return None
+        root_i, root_j = root(i), root(j)
+        if root_i == root_j and len(included) < n:
+            return None
+        parent[root_i] = root_j
+
+    included_set = set(included)
+    excluded = set(excluded)
+    for city in range(n):
+        if degree[city] == 2:
+            excluded.update((min(city, other), max(city, other)) for other in range(n)
+                            if other != city and (min(city, other), max(city, other)) not in included_set)
+    if included_set & excluded:
+        return None
+    return tuple(included), tuple(sorted(excluded))
+
+
+def _tour_length(dists: np.ndarray, tour: Sequence[int]) -> float:
+    return float(sum(dists[tour[i], tour[(i + 1) % len(tour)]] for i in range(len(tour))))
+
+
+# Search of a BranchAndBound worker process, created once per worker.
+_worker_search: Dict[str, Any] = {}
+
+
+def _attach_worker(dists: np.ndarray, incumbent, node_iterations: int, deadline: Optional[float]) -> None:
+    _worker_search['search'] = _Search(dists, incumbent, node_iterations, deadline)
+
+
+def _search_subtrees(frontier: List[Tuple[BranchAndBound.Node, np.ndarray]]):
+    return _worker_search['search'].depth_first(frontier)
@@ -0,0 +1,233 @@
+from abc import ABC, abstractmethod
+from typing import List, Optional
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+class Construction(ABC):
+    """Builds a tour through cities given by their coordinates.
+
+    Heuristics work on coordinates only, so they take O(n log n) time and
+    never need the distance matrix. With randomize the heuristic starts from
+    a random place, and noise shifts every city by a normal offset of noise
+    times the average spacing of cities. Together they give different tours
+    for a population or for repeated runs.
+    """
+    def __init__(self, randomize: bool = True, noise: float = 0.0):
+        self.randomize = randomize
+        self.noise = noise
+
+    def tour(self, coordinates: Optional[np.ndarray], random: np.random.Generator) -> np.ndarray:
+        """Return a tour as an int32 array of city indices."""
+        if coordinates is None:
+            raise ValueError(f'{type(self).__name__} needs city coordinates, the instance only has distances')
+        points = np.asarray(coordinates, dtype=float)
+        if self.noise > 0 and len(points) > 1:
+            points = points + random.normal(scale=self.noise * self._spacing(points), size=points.shape)
+        return self._build(points, random).astype(np.int32)
+
+    @staticmethod
+    def _spacing(points: np.ndarray) -> float:
+        """Typical distance between neighbouring cities, estimated from the bounding box."""
+        extent = np.ptp(points, axis=0)
+        area = np.prod(extent[extent > 0]) if np.any(extent > 0) else 1.0
+        return float(np.sqrt(area / len(points)))
+
+    @abstractmethod
+    def _build(self, points: np.ndarray, random: np.random.Generator) -> np.ndarray:
+        pass
+
+
+def nearest_neighbour_tour(dists: np.ndarray, start: int = 0) -> np.ndarray:
+    """Tour from start always going to the closest unvisited city, read from the matrix.
+
+    Takes O(n^2) time, for instances given by distances only.
+    """
+    n = len(dists)
+    tour = np.zeros(n, dtype=np.int32)
+    tour[0] = start
+    visited = np.zeros(n, dtype=bool)
+    visited[start] = True
+    for i in range(1, n):
+        row = np.where(visited, np.inf, dists[tour[i - 1]])
+        tour[i] = np.argmin(row)
+        visited[tour[i]] = True
+    return tour
+
+
+class NearestNeighbour(Construction):
+    """Goes to the closest unvisited city, found by a k-d tree over the cities.
+
+    The tree is rebuilt on unvisited cities once half of its cities are
+    visited, so queries stay short and rebuilding costs O(n log n) in total.
+    """
+    QUERY = 8  # Number of closest cities asked for first, doubled until one is unvisited.
+
+    def _build(self, points: np.ndarray, random: np.random.Generator) -> np.ndarray:
+        n = len(points)
+        start = int(random.integers(n)) if self.randomize else 0
+        tour = np.empty(n, dtype=np.int64)
+        tour[0] = start
+        visited = np.zeros(n, dtype=bool)
+        visited[start] = True
+
+        in_tree = np.arange(n)
+        tree = cKDTree(points)
+        unvisited_in_tree = n - 1
+        current = start
+        for i in range(1, n):
+            if 2 * unvisited_in_tree < len(in_tree):
+                in_tree = np.flatnonzero(~visited)
+                tree = cKDTree(points[in_tree])
+                unvisited_in_tree = len(in_tree)
+
+            k = min(self.QUERY, len(in_tree))
+            while True:
+                _, found = tree.query(points[current], k=k)
+                candidates = in_tree[np.atleast_1d(found)]
+                free = candidates[~visited[candidates]]
+                if len(free) > 0 or k == len(in_tree):
+                    break
+                k = min(2 * k, len(in_tree))
+
+            current = int(free[0])
+            tour[i] = current
+            visited[current] = True
+            unvisited_in_tree -= 1
+
+        return tour
+
+
+class GreedyEdge(Construction):
+    """Adds the shortest edges that keep every city at degree two or less and close no cycle.
+
+    Edges are taken from the nearest neighbours of every city. The fragments
+    left at the end are joined by going from the end of one to the closest
+    end of another.
+    """
+    def __init__(self, randomize: bool = True, noise: float = 0.0, neighbours: int = 10):
+        super().__init__(randomize, noise)
+        self.neighbours = neighbours
+
+    def _build(self, points: np.ndarray, random: np.random.Generator) -> np.ndarray:
+        n = len(points)
+        if n < 3:
+            return np.arange(n)
+
+        k = min(self.neighbours, n - 1)
+        _, found = cKDTree(points).query(points, k=k + 1)
+        cities = np.repeat(np.arange(n), k + 1)
+        found = found.ravel()
+        ordered = (cities < found)
+        first = np.where(ordered, cities, found)
+        second = np.where(ordered, found, cities)
+        edges = np.unique(np.stack([first, second], axis=1)[cities != found], axis=0)
+        edge_lengths = np.linalg.norm(points[edges[:, 0]] - points[edges[:, 1]], axis=1)
+        edges = edges[np.argsort(edge_lengths, kind='stable')].tolist()
+
+        adjacent: List[List[int]] = [[] for _ in range(n)]
+        parent = list(range(n))
+
+        def root(city: int) -> int:
+            while parent[city] != city:
+                parent[city] = parent[parent[city]]
+                city = parent[city]
+            return city
+
+        for u, v in edges:
+            if len(adjacent[u]) < 2 and len(adjacent[v]) < 2:
+                root_u, root_v = root(u), root(v)
+                if root_u != root_v:
+                    parent[root_u] = root_v
+                    adjacent[u].append(v)
+                    adjacent[v].append(u)
+
+        return self._join(self._fragments(adjacent), points, random)
+
+    @staticmethod
+    def _fragments(adjacent: List[List[int]]) -> List[List[int]]:
+        """Paths formed by the chosen edges, every one going from end to end."""
+        fragments = []
+        seen = [False] * len(adjacent)
+        for city in range(len(adjacent)):
+            if seen[city] or len(adjacent[city]) == 2:
+                continue
+            fragment, previous = [city], -1
+            seen[city] = True
+            while True:
+                following = [c for c in adjacent[fragment[-1]] if c != previous]
+                if not following:
+                    break
+                previous = fragment[-1]
+                fragment.append(following[0])
+                seen[following[0]] = True
+            fragments.append(fragment)
+        return fragments
+
+    def _join(self, fragments: List[List[int]], points: np.ndarray, random: np.random.Generator) -> np.ndarray:
+        heads = points[[fragment[0] for fragment in fragments]]
+        tails = points[[fragment[-1] for fragment in fragments]]
+        joined = np.zeros(len(fragments), dtype=bool)
+
+        current = int(random.integers(len(fragments))) if self.randomize else 0
+        tour = list(fragments[current])
+        joined[current] = True
+        for _ in range(len(fragments) - 1):
+            end = points[tour[-1]]
+            to_heads = np.where(joined, np.inf, np.linalg.norm(heads - end, axis=1))
+            to_tails = np.where(joined, np.inf, np.linalg.norm(tails - end, axis=1))
+            head, tail = int(np.argmin(to_heads)), int(np.argmin(to_tails))
+            if to_heads[head] <= to_tails[tail]:
+                tour.extend(fragments[head])
+                joined[head] = True
+            else:
+                tour.extend(reversed(fragments[tail]))
+                joined[tail] = True
+
+        return np.array(tour)
+
+
+class SpaceFillingCurve(Construction):
+    """Visits cities in the order of a Hilbert curve through their bounding box.
+
+    With randomize the curve is turned or mirrored by one of the eight
+    symmetries of the square.
+    """
+    def __init__(self, randomize: bool = True, noise: float = 0.0, order: int = 16):
+        super().__init__(randomize, noise)
+        self.order = order
+
+    def _build(self, points: np.ndarray, random: np.random.Generator) -> np.ndarray:
+        if self.randomize:
+            symmetry = int(random.integers(8))
+            if symmetry & 1:
+                points = points[:, ::-1]
+            if symmetry & 2:
+                points = points * [-1, 1]
+            if symmetry & 4:
+                points = points * [1, -1]
+
+        side = 1 << self.order
+        lowest = points.min(axis=0)
+        extent = max(float(np.ptp(points, axis=0).max()), 1e-12)
+        cells = np.minimum(((points - lowest) / extent * side).astype(np.int64), side - 1)
+        return np.argsort(self._hilbert_index(cells[:, 0], cells[:, 1], side), kind='stable')
+
+    @staticmethod
+    def _hilbert_index(x: np.ndarray, y: np.ndarray, side: int) -> np.ndarray:
+        """Distance along the Hilbert curve of a side x side grid for every cell (x, y)."""
+        index = np.zeros(len(x), dtype=np.int64)
+        x, y = x.copy(), y.copy()
+        s = side // 2
+        while s > 0:
+            rx = (x & s) > 0
+            ry = (y & s) > 0
+            index += s * s * ((3 * rx) ^ ry)
+
+            # Rotate the quadrant so that the curve inside it has the base orientation.
+            flip = ~ry & rx
+            x = np.where(flip, side - 1 - x, x)
+            y = np.where(flip, side - 1 - y, y)
+            x, y = np.where(~ry, y, x), np.where(~ry, x, y)
+            s //= 2
+        return index
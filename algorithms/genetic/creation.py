@@ -1,7 +1,6 @@
-import random
 from abc import ABC, abstractmethod
 import numpy as np
-from algorithms.genetic.species import Species
+from algorithms.construction import Construction, nearest_neighbour_tour
 from tsp import TSP
 
 
@@ -10,7 +9,8 @@ class Creation(ABC):
         self.size = size
 
     @abstractmethod
-    def generate_population(self, length: int) -> np.array:
+    def generate_population(self, length: int, random: np.random.Generator) -> np.ndarray:
+        """Return the population as a (size, length) int32 matrix, one path per row"""
         pass
 
 
@@ -18,13 +18,9 @@ class RandomCreation(Creation):
     def __int__(self, size: int):
         super().__init__(size)
 
-    def generate_population(self, length: int) -> np.array:
-        population = []
-        for i in range(self.size):
-            species = Species(np.random.permutation(length))
-            population.append(species)
-
-        return np.array(population)
+    def generate_population(self, length: int, random: np.random.Generator) -> np.ndarray:
+        # every row is sorted by its own random keys, giving independent permutations
+        return np.argsort(random.random((self.size, length)), axis=1).astype(np.int32)
 
 
 class EfficientCreation(Creation):
@@ -33,18 +29,18 @@ class EfficientCreation(Creation):
         self.dists = np.array(tsp.dists())
         self.dists = np.argsort(self.dists, axis=0)
 
-    def generate_population(self, length: int) -> np.array:
-        population = []
+    def generate_population(self, length: int, random: np.random.Generator) -> np.ndarray:
+        population = np.empty((self.size, length), dtype=np.int32)
 
         for i in range(self.size):
-            population.append(Species(self.generate_clever_path(length)))
+            population[i] = self.generate_clever_path(length, random)
 
-        return np.array(population)
+        return population
 
-    def generate_clever_path(self, length) -> np.array:
+    def generate_clever_path(self, length, random: np.random.Generator) -> np.array:
         path = []
         used = np.zeros(length)
-        start = random.randint(0, length - 1)
+        start = int(random.integers(0, length))
         used[start] = 1
         used_count = 1
         path.append(start)
@@ -60,3 +56,26 @@ class EfficientCreation(Creation):
                 used[index] = 1
                 used_count += 1
                 return index
+
+
+class ConstructionCreation(Creation):
+    """builds every species with a construction heuristic, randomized to keep the population diverse
+
+    Instances without coordinates get nearest neighbour tours from the matrix, each from a random city.
+    """
+    def __init__(self, size: int, tsp: TSP, construction: Construction):
+        super().__init__(size)
+        self.coordinates = tsp.coordinates
+        self.dists = np.asarray(tsp.dists()) if tsp.coordinates is None else None
+        self.construction = construction
+
+    def generate_population(self, length: int, random: np.random.Generator) -> np.ndarray:
+        population = np.empty((self.size, length), dtype=np.int32)
+
+        for i in range(self.size):
+            if self.coordinates is None:
+                population[i] = nearest_neighbour_tour(self.dists, int(random.integers(length)))
+            else:
+                population[i] = self.construction.tour(self.coordinates, random)
+
+        return population
@@ -1,148 +1,214 @@
-import random
 from abc import ABC, abstractmethod
+from random import Random
+from typing import List, Tuple
 
-from algorithms.genetic.species import Species
 import numpy as np
-import random
 
 class ParentGenerator(ABC):
     @abstractmethod
-    def generate(self, population: np.array, pairs: int):
+    def generate(self, fitness: np.ndarray, pairs: int, random: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+        """Return indices of first and second parents of every pair"""
         pass
 
 
 class InbreedingParentGenerator(ParentGenerator):
-    def generate(self, population: np.array, pairs: int):
-        sorted_population = sorted(population)
+    """pairs a random species with the closest by fitness of its neighbours in fitness order"""
+    def generate(self, fitness: np.ndarray, pairs: int, random: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+        n = len(fitness)
+        order = np.argsort(fitness)
+        sorted_fitness = fitness[order]
 
-        for i in range(pairs):
-            index = random.randint(0, len(sorted_population) - 1)
-            fitness = sorted_population[index].get_fitness()
-            prev_fitness = sorted_population[(index - 1 + len(sorted_population)) % len(sorted_population)].get_fitness()
-            next_fitness = sorted_population[(index + 1) % len(sorted_population)].get_fitness()
-            if abs(fitness - prev_fitness) < abs(fitness - next_fitness):
-                yield sorted_population[index], sorted_population[(index - 1 + len(sorted_population)) % len(sorted_population)]
-            else:
-                yield sorted_population[index], sorted_population[(index + 1) % len(sorted_population)]
+        index = random.integers(0, n, size=pairs)
+        prev_index = (index - 1) % n
+        next_index = (index + 1) % n
+        closer_prev = (np.abs(sorted_fitness[index] - sorted_fitness[prev_index]) <
+                       np.abs(sorted_fitness[index] - sorted_fitness[next_index]))
+
+        return order[index], order[np.where(closer_prev, prev_index, next_index)]
 
 
 class OutbreedingParentGenerator(ParentGenerator):
-    def generate(self, population: np.array, pairs: int):
-        first = np.argmin(population)
-        last = np.argmax(population)
+    """pairs a random species with the farther by fitness of the best and the worst species"""
+    def generate(self, fitness: np.ndarray, pairs: int, random: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+        first = np.argmin(fitness)
+        last = np.argmax(fitness)
+
+        index = random.integers(0, len(fitness), size=pairs)
+        closer_last = np.abs(fitness[index] - fitness[first]) > np.abs(fitness[index] - fitness[last])
 
-        for i in range(pairs):
-            index = random.randint(0, len(population) - 1)
-            fitness = population[i].get_fitness()
-            if abs(fitness - population[first].get_fitness()) > abs(fitness + population[last].get_fitness()):
-                yield population[i], population[first]
-            else:
-                yield population[i], population[last]
+        return index, np.where(closer_last, first, last)
 
 
 class PanmixiaParentGenerator(ParentGenerator):
-    def generate(self, population: np.array, pairs: int):
-        for i in range(pairs):
-            first = random.randint(0, len(population) - 1)
-            second = random.randint(0, len(population) - 1)
-            yield population[first], population[second]
+    def generate(self, fitness: np.ndarray, pairs: int, random: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+        first = random.integers(0, len(fitness), size=pairs)
+        second = random.integers(0, len(fitness), size=pairs)
+        return first, second
 
 
 class Crossover(ABC):
     @abstractmethod
-    def generate_offspring(self, first_parent: Species, second_parent: Species) -> Species:
+    def generate_offspring(self, first_parent: np.ndarray, second_parent: np.ndarray,
+                           random: np.random.Generator) -> np.ndarray:
         pass
 
+    def generate_offsprings(self, tours: np.ndarray, first_parents: np.ndarray,
+                            second_parents: np.ndarray, random: np.random.Generator) -> np.ndarray:
+        """Return a matrix with a child of tours[first_parents[i]] and tours[second_parents[i]] in row i"""
+        children = np.empty((len(first_parents), tours.shape[1]), dtype=np.int32)
+        for i, (first, second) in enumerate(zip(first_parents, second_parents)):
+            children[i] = self.generate_offspring(tours[first], tours[second], random)
+        return children
+
 
 class OrderCrossover(Crossover):
     """takes random substring from one parent and fills the rest with cities from other parent considering order"""
-    def generate_offspring(self, first_parent: Species, second_parent: Species) -> Species:
-        path_length = first_parent.size()
-        start, finish = random.randint(0, path_length - 1), random.randint(0, path_length - 1)
-        if start > finish:
-            start, finish = finish, start
+    def generate_offspring(self, first_parent: np.ndarray, second_parent: np.ndarray,
+                           random: np.random.Generator) -> np.ndarray:
+        parents = np.stack((first_parent, second_parent))
+        return self.generate_offsprings(parents, np.array([0]), np.array([1]), random)[0]
+
+    def generate_offsprings(self, tours: np.ndarray, first_parents: np.ndarray,
+                            second_parents: np.ndarray, random: np.random.Generator) -> np.ndarray:
+        first, second = tours[first_parents], tours[second_parents]
+        pairs, path_length = first.shape
+        rows = np.arange(pairs)[:, None]
+        positions = np.arange(path_length)
 
-        new_path = list(range(path_length))
-        used = set()
-        for i in range(start, finish):
-            new_path[i] = first_parent.get_path()[i]
-            used.add(new_path[i])
+        cuts = np.sort(random.integers(0, path_length, size=(pairs, 2)), axis=1)
+        start, finish = cuts[:, :1], cuts[:, 1:]
+        inside = (start <= positions) & (positions < finish)
 
-        last_index = finish % path_length
-        for i in range(path_length):
-            index = (finish + i) % path_length
-            if second_parent.get_path()[index] not in used:
-                new_path[last_index] = second_parent.get_path()[index]
-                last_index = (last_index + 1) % path_length
+        children = np.empty_like(first)
+        children[inside] = first[inside]
 
-        return Species(new_path)
+        # cities of the copied substring are taken, the rest come from the second
+        # parent in its order starting from the end of the substring
+        taken = np.zeros((pairs, path_length), dtype=bool)
+        taken[np.nonzero(inside)[0], first[inside]] = True
+        rotated = second[rows, (finish + positions) % path_length]
+        free = ~taken[rows, rotated]
+
+        targets = (finish + np.cumsum(free, axis=1) - 1) % path_length
+        children[np.nonzero(free)[0], targets[free]] = rotated[free]
+
+        return children
 
 
 class EdgeRecombinationCrossover(Crossover):
     """inherits as many edges from parents as possible"""
     class EdgeMap:
-        class IncidentEdges:
-            def __init__(self):
-                self.set = set()
-                self.not_used = 0
-
-            def add(self, edge: int):
-                self.set.add(edge)
-                self.not_used += 1
-
-            def use(self, edge: int):
-                self.set.remove(edge)
-                self.not_used -= 1
-
-        def __init__(self, first: Species, second: Species):
-            self.n = first.size()
-            self.map = [self.IncidentEdges() for _ in range(first.size())]
-            self.not_used = set(list(range(self.n)))
-            self._add(first)
-            self._add(second)
-
-        def step(self, prev) -> int:
-            # 1. find city with max not used incident edges
-            min_value = -1
-            min_index = []
-            for i in self.map[prev].set:
-                if min_value == -1 or 0 < self.map[i].not_used < min_value:
-                    min_value = self.map[i].not_used
-                    min_index = [i]
-                elif self.map[i].not_used == min_value:
-                    min_index.append(i)
-
-            # 2. select one of these cities randomly
-            if len(min_index) > 0:
-                random_index = min_index[random.randint(0, len(min_index) - 1)]
-            else:
-                random_index = random.choice(list(self.not_used))
-
-            # 3. delete it from other sets and clear
-            for edge in self.map[random_index].set:
-                self.map[edge].use(random_index)
-
-            self.not_used.remove(random_index)
-
-            return random_index
-
-        def get_path(self) -> np.array:
-            prev = -1
-            path = []
-            for i in range(self.n):
-                path.append(self.step(prev))
-                prev = path[-1]
+        """Edge table of two parents with buffers reused by every child of a generation.
+
+        Row of a city is the slice [4 * city, 4 * city + 4) of the flat
+        neighbours list holding its distinct neighbours, the first
+        degree[city] of which are not used yet.
+        Unused cities are kept in an index array with their positions, so
+        a random one is picked and removed in O(1). Choices are drawn from the
+        given Python stream, which is much faster per draw than a NumPy one.
+        """
+        def __init__(self, n: int, stream: Random):
+            self.n = n
+            self.randrange = stream.randrange
+            self.neighbours = [0] * (4 * n)
+            self.degree = [0] * n
+            self.unused = list(range(n))
+            self.unused_position = list(range(n))
+            self.unused_count = n
+            self.path = [0] * n
+
+        def fill(self, first: np.ndarray, second: np.ndarray) -> None:
+            neighbours, degree = self.neighbours, self.degree
+            self.unused[:] = range(self.n)
+            self.unused_position[:] = range(self.n)
+            self.unused_count = self.n
+
+            # edges of one tour are distinct, only those of the second parent are checked
+            path = first.tolist()
+            previous, city = path[-1], path[0]
+            for following in path[1:] + path[:1]:
+                start = 4 * city
+                neighbours[start] = previous
+                neighbours[start + 1] = following
+                degree[city] = 2
+                previous, city = city, following
+
+            path = second.tolist()
+            previous, city = path[-1], path[0]
+            for following in path[1:] + path[:1]:
+                start = 4 * city
+                end = start + degree[city]
+                if previous != neighbours[start] and previous != neighbours[start + 1]:
+                    neighbours[end] = previous
+                    end += 1
+                if following != neighbours[start] and following != neighbours[start + 1]:
+                    neighbours[end] = following
+                    end += 1
+                degree[city] = end - start
+                previous, city = city, following
+
+        def _use(self, city: int) -> None:
+            """Remove the city from the rows of its neighbours and from unused cities"""
+            neighbours, degree = self.neighbours, self.degree
+            start = 4 * city
+            for row in neighbours[start:start + degree[city]]:
+                last = 4 * row + degree[row] - 1
+                index = neighbours.index(city, 4 * row, last + 1)
+                neighbours[index] = neighbours[last]
+                degree[row] -= 1
+
+            self.unused_count -= 1
+            position, moved = self.unused_position[city], self.unused[self.unused_count]
+            self.unused[position] = moved
+            self.unused_position[moved] = position
+
+        def step(self, prev: int) -> int:
+            # 1. find neighbours of prev with min not used incident edges, select one of them randomly
+            degree = self.degree
+            start = 4 * prev
+            chosen, min_value, ties = -1, 5, 0
+            for city in self.neighbours[start:start + degree[prev]]:
+                value = degree[city]
+                if value < min_value:
+                    chosen, min_value, ties = city, value, 1
+                elif value == min_value:
+                    ties += 1
+                    if self.randrange(ties) == 0:
+                        chosen = city
+
+            # 2. or a random not used city if prev has no edges left
+            if chosen == -1:
+                chosen = self.unused[self.randrange(self.unused_count)]
+
+            # 3. delete it from other rows
+            self._use(chosen)
+            return chosen
+
+        def get_path(self) -> List[int]:
+            path = self.path
+            prev = self.unused[self.randrange(self.unused_count)]
+            self._use(prev)
+            path[0] = prev
+            for i in range(1, self.n):
+                prev = self.step(prev)
+                path[i] = prev
             return path
 
-        def _add(self, species: Species):
-            size = species.size()
-            for i in range(size):
-                path = species.get_path()
-                self.map[path[i]].add(path[(i + 1) % size])
-                self.map[path[i]].add(path[(i - 1 + size) % size])
+    # Buffers belong to a call rather than to the crossover, so that concurrent
+    # solves may share one instance.
+
+    def generate_offspring(self, first_parent: np.ndarray, second_parent: np.ndarray,
+                           random: np.random.Generator) -> np.ndarray:
+        edge_map = self.EdgeMap(len(first_parent), Random(int(random.integers(2 ** 63))))
+        edge_map.fill(first_parent, second_parent)
 
-    def generate_offspring(self, first_parent: Species, second_parent: Species) -> Species:
-        edge_map = self.EdgeMap(first_parent, second_parent)
-        new_path = edge_map.get_path()
+        return np.array(edge_map.get_path(), dtype=np.int32)
 
-        return Species(new_path)
+    def generate_offsprings(self, tours: np.ndarray, first_parents: np.ndarray,
+                            second_parents: np.ndarray, random: np.random.Generator) -> np.ndarray:
+        children = np.empty((len(first_parents), tours.shape[1]), dtype=np.int32)
+        edge_map = self.EdgeMap(tours.shape[1], Random(int(random.integers(2 ** 63))))
+        for i, (first, second) in enumerate(zip(first_parents, second_parents)):
+            edge_map.fill(tours[first], tours[second])
+            children[i] = edge_map.get_path()
+        return children
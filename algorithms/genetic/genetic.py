@@ -1,11 +1,13 @@
 from dataclasses import dataclass
+from typing import Callable, Optional, Tuple
 
 from .creation import Creation
 from .selection import Selection
 from .mutation import Mutation
 from .crossover import ParentGenerator, Crossover
-from .species import Species
-from tsp import TSP
+from algorithms.shared import WorkerPool, worker_arrays
+from algorithms.stopping import StoppingCriteria
+from tsp import TSP, Recorder
 import numpy as np
 
 
@@ -21,45 +23,150 @@ class GeneticAlgorithm:
         iterations: int = 500
         survived: float = 0.5  # fraction of survived species after selection
         mutated: float = 0.3  # fraction of mutated species
+        stopping: Optional[StoppingCriteria] = None  # conditions to return before all iterations are run
+        workers: int = 1  # number of processes breeding the children of a generation
+        seed: Optional[int] = None  # seed of the random streams, None for an unpredictable run
 
     def __init__(self, settings: Settings):
         self.settings = settings
 
-    def solve(self, tsp: TSP, logging: bool = True) -> float:
-        Species.set_tsp(tsp)
-        population = self.settings.creation.generate_population(tsp.cities_amount)  # TODO
-        # alltime_killed = np.array([])
-        best_answer = None
+        # why the last solve returned and how many iterations it ran
+        self.stop_reason = StoppingCriteria.Reason.ITERATIONS
+        self.iterations_done = 0
 
-        for i in range(self.settings.iterations):
-            # selection
-            population = self.settings.selection.select(population)
-            # alltime_killed = np.append(alltime_killed, killed)
+        # random streams, one per solve and one per chunk of children bred by a worker
+        self.seed_sequence = np.random.SeedSequence(self.settings.seed)
+        self.random = np.random.default_rng(self.seed_sequence)
+        self.pool: Optional[WorkerPool] = None
 
-            # crossover
-            children = []
-            pairs = (self.settings.population_size - len(population))
-            for first_parent, second_parent in self.settings.parent_generator.generate(population, pairs): # TODO allow killed to crossover?
-                child = self.settings.crossover.generate_offspring(first_parent, second_parent)
-                children.append(child)
+        # population of the current solve sorted by fitness and the best tour found
+        self.tours = np.empty((0, 0), dtype=np.int32)
+        self.fitness = np.empty(0)
+        self.best_path: Optional[np.ndarray] = None
+        self.best_fitness = float('inf')
 
-            population = np.append(population, children)
+        # where the results of the current solve are recorded
+        self.recorder: Optional[Recorder] = None
 
-            # mutation
-            population = self.settings.mutation.make_mutations(population)
+    def solve(self, tsp: TSP, logging: bool = True, recorder: Optional[Recorder] = None,
+              on_iteration: Optional[Callable[[int], None]] = None) -> float:
+        """Evolve the population, return the best distance found
 
-            # normalize population and save history
-            population = np.sort(population)
-            if (best_answer is None) or (population[0].get_fitness() < best_answer.get_fitness()):
-                best_answer = population[0].copy()
+        History goes to the given recorder or to the default recorder of the tsp.
+        on_iteration is called with the number of generations done after each
+        of them, before the stopping criteria are checked.
+        """
+        self.recorder = recorder if recorder is not None else tsp.recorder
+        monitor = self.settings.stopping.monitor() if self.settings.stopping is not None else None
+        self.stop_reason = StoppingCriteria.Reason.ITERATIONS
+        self.iterations_done = 0
 
-            if logging:
-                tsp.add_iteration(tsp.path_length(population[0].get_path()))
-                best_answer_states = [TSP.State(0, best_answer.get_path()[i]) for i in range(len(best_answer.get_path()))]
-                best_answer_states.append(TSP.State(0, best_answer.get_path()[0]))
-                tsp.add_to_history(best_answer_states, best_answer.get_fitness())
+        try:
+            self._prepare(tsp)
+            for i in range(self.settings.iterations):
+                self._iteration(tsp, logging)
+                self.iterations_done += 1
+                if on_iteration is not None:
+                    on_iteration(self.iterations_done)
 
+                if monitor is not None:
+                    reason = monitor.check(self.best_fitness)
+                    if reason is not None:
+                        self.stop_reason = reason
+                        break
+        finally:
+            self._release()
 
-        return best_answer.get_fitness()
+        self.recorder.solution = self.best_fitness
+        return self.best_fitness
 
+    def _prepare(self, tsp: TSP) -> None:
+        """Seed the random streams of a new solve, start its workers and create the population"""
+        self.seed_sequence = np.random.SeedSequence(self.settings.seed)
+        self.random = np.random.default_rng(self.seed_sequence.spawn(1)[0])
 
+        self.pool = None
+
+        self.tours = self.settings.creation.generate_population(tsp.cities_amount, self.random)
+        self.fitness = tsp.path_lengths(self.tours)
+        self.best_path, self.best_fitness = None, float('inf')
+
+        # workers are started last, so that nothing fails after they hold resources
+        if self.settings.workers > 1:
+            # workers read distances and parents from shared memory, so only
+            # parent indices and children travel between processes
+            self.pool = WorkerPool(self.settings.workers,
+                                   {'dists': np.asarray(tsp.dists(), dtype=float),
+                                    'tours': np.empty((self.settings.population_size, tsp.cities_amount), np.int32)},
+                                   {'crossover': self.settings.crossover})
+
+    def _release(self) -> None:
+        """Stop the workers and free the shared memory of the last solve, also of a partly prepared one"""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+    def _iteration(self, tsp: TSP, logging: bool) -> None:
+        """Run one generation"""
+        # selection
+        survivors = self.settings.selection.select(self.fitness, self.random)
+        tours, fitness = self.tours[survivors], self.fitness[survivors]
+
+        # crossover
+        children, children_fitness = self._breed(tsp, tours, fitness)
+        tours = np.concatenate((tours, children))
+        fitness = np.concatenate((fitness, children_fitness))
+
+        # mutation
+        tours, fitness = self.settings.mutation.make_mutations(tours, fitness, tsp, self.random)
+
+        # normalize population and save history
+        self._set_population(tours, fitness)
+
+        if logging:
+            self.recorder.add_iteration(self.fitness[0])
+            best_answer_path = self.best_path.tolist()
+            best_answer_path.append(best_answer_path[0])
+            self.recorder.add_to_history(best_answer_path, self.best_fitness)
+
+    def _set_population(self, tours: np.ndarray, fitness: np.ndarray) -> None:
+        """Keep the population sorted by fitness and remember the best tour"""
+        order = np.argsort(fitness, kind='stable')
+        self.tours, self.fitness = tours[order], fitness[order]
+        if self.fitness[0] < self.best_fitness:
+            self.best_path, self.best_fitness = self.tours[0].copy(), float(self.fitness[0])
+
+    def immigrate(self, tsp: TSP, tours: np.ndarray) -> None:
+        """Replace the worst species of the population by the given tours"""
+        tours = tours[:len(self.tours)]
+        self.tours[len(self.tours) - len(tours):] = tours
+        self.fitness[len(self.fitness) - len(tours):] = tsp.path_lengths(tours)
+        self._set_population(self.tours, self.fitness)
+
+    def _breed(self, tsp: TSP, tours: np.ndarray, fitness: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Return children filling the population up to its size and their fitness"""
+        pairs = self.settings.population_size - len(tours)
+        first_parents, second_parents = self.settings.parent_generator.generate(fitness, pairs, self.random)
+
+        if self.pool is None:
+            children = self.settings.crossover.generate_offsprings(tours, first_parents, second_parents, self.random)
+            return children, tsp.path_lengths(children)
+
+        self.pool.array('tours')[:len(tours)] = tours
+        first_chunks = np.array_split(first_parents, self.settings.workers)
+        second_chunks = np.array_split(second_parents, self.settings.workers)
+        seeds = self.seed_sequence.spawn(len(first_chunks))
+        results = self.pool.starmap(_breed_chunk, zip(first_chunks, second_chunks, seeds))
+
+        children = np.concatenate([chunk_children for chunk_children, _ in results])
+        return children, np.concatenate([chunk_fitness for _, chunk_fitness in results])
+
+
+def _breed_chunk(first_parents: np.ndarray, second_parents: np.ndarray,
+                 seed: np.random.SeedSequence) -> Tuple[np.ndarray, np.ndarray]:
+    """Generate a part of the children of a generation inside a worker process"""
+    tours = worker_arrays['tours'].array
+    children = worker_arrays['crossover'].generate_offsprings(tours, first_parents, second_parents,
+                                                               np.random.default_rng(seed))
+    dists = worker_arrays['dists'].array
+    return children, dists[children, np.roll(children, -1, axis=1)].sum(axis=1)
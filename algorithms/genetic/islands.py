@@ -0,0 +1,118 @@
+from enum import Enum, auto
+from multiprocessing import Queue
+from queue import Empty
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .genetic import GeneticAlgorithm
+from algorithms.island_model import record_iterations, run_islands
+from algorithms.stopping import StoppingCriteria
+from tsp import TSP, Recorder
+
+
+class IslandGeneticAlgorithm:
+    """Island model of genetic algorithms running in separate processes.
+
+    Every `exchange` generations each island sends copies of its `migrants`
+    best tours to a neighbour, where they replace the worst species. In a ring
+    the neighbour is the next island and an island waits for the tours of the
+    previous one. With the random topology the neighbour is drawn every time,
+    and an island takes whatever tours arrived without waiting.
+    """
+    class Topology(Enum):
+        RING = auto()
+        RANDOM = auto()
+
+    class History(NamedTuple):
+        distance: float
+        iterations: List[float]  # best distance of the island after every generation
+        stop_reason: StoppingCriteria.Reason
+
+    def __init__(self, islands: List[GeneticAlgorithm.Settings], exchange: int = 10, migrants: int = 5,
+                 topology: Topology = Topology.RING):
+        self.islands = islands
+        self.exchange = exchange
+        self.migrants = migrants
+        self.topology = topology
+
+        self.best_path: List[int] = []
+        self.best_fitness = float('inf')
+        self.histories: List[IslandGeneticAlgorithm.History] = []
+
+    def solve(self, tsp: TSP, logging: bool = True, recorder: Optional[Recorder] = None) -> float:
+        """Run all islands, return the best distance found by any of them.
+
+        Per-island results are kept in histories, the overall ones go to the
+        given recorder or to the default recorder of the tsp.
+        """
+        recorder = recorder if recorder is not None else tsp.recorder
+        collected = run_islands(_run_island, [(settings, tsp, self.exchange, self.migrants, self.topology)
+                                              for settings in self.islands])
+
+        self.histories = []
+        self.best_path, self.best_fitness = [], float('inf')
+        for path, distance, iterations, stop_reason in collected:
+            self.histories.append(IslandGeneticAlgorithm.History(distance, iterations, stop_reason))
+            if distance < self.best_fitness:
+                self.best_path, self.best_fitness = path, distance
+
+        if logging:
+            record_iterations(recorder, [history.iterations for history in self.histories])
+            recorder.add_to_history(self.best_path + self.best_path[:1], self.best_fitness)
+
+        recorder.solution = self.best_fitness
+        return self.best_fitness
+
+
+def _run_island(index: int, queues: List[Queue], settings: GeneticAlgorithm.Settings, tsp: TSP, exchange: int,
+                migrants: int, topology: IslandGeneticAlgorithm.Topology
+                ) -> Tuple[List[int], float, List[float], StoppingCriteria.Reason]:
+    """Run one island of an IslandGeneticAlgorithm inside its own process.
+
+    In a ring an island that finishes or fails sends None, after which its
+    successor stops waiting for tours from it.
+    """
+    n_islands = len(queues)
+    inbox = queues[index]
+    ring = topology == IslandGeneticAlgorithm.Topology.RING
+    island = GeneticAlgorithm(settings)
+    predecessor_running = True
+    iterations = []
+
+    def migrate(iteration: int) -> None:
+        nonlocal predecessor_running
+        iterations.append(island.best_fitness)
+        if exchange <= 0 or n_islands <= 1 or iteration % exchange != 0:
+            return
+
+        if ring:
+            neighbour = (index + 1) % n_islands
+        else:
+            neighbour = (index + int(island.random.integers(1, n_islands))) % n_islands
+        queues[neighbour].put(island.tours[:migrants].copy())
+
+        arrived = []
+        if not ring:
+            try:
+                while True:
+                    arrived.append(inbox.get_nowait())
+            except Empty:
+                pass
+        elif predecessor_running:
+            migrant = inbox.get()
+            if migrant is None:
+                predecessor_running = False
+            else:
+                arrived.append(migrant)
+
+        if arrived:
+            island.immigrate(tsp, np.concatenate(arrived))
+
+    try:
+        island.solve(tsp, logging=False, on_iteration=migrate)
+    finally:
+        if ring:
+            queues[(index + 1) % n_islands].put(None)
+
+    return island.best_path.tolist(), island.best_fitness, iterations, island.stop_reason
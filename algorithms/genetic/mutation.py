@@ -1,64 +1,76 @@
 from abc import ABC, abstractmethod
+from typing import Optional, Tuple
 import numpy as np
-import random
-from .species import Species
+
+from algorithms.local_search import LocalSearch, TwoOptOrOpt
 
 
 class Mutation(ABC):
     def __init__(self, mutated: float):
         self.mutated = mutated
 
-    def make_mutations(self, population: np.array) -> np.array:
-        indexes = random.sample(list(range(len(population))), int(np.ceil(len(population) * self.mutated)))
+    def make_mutations(self, tours: np.ndarray, fitness: np.ndarray, tsp,
+                       random: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+        """Mutate a random fraction of tours in place, return tours and their updated fitness"""
+        indexes = random.choice(len(tours), int(np.ceil(len(tours) * self.mutated)), replace=False)
         for index in indexes:
-            population[index] = self.mutate(population[index])
+            fitness[index] += self.mutate(tours[index], tsp.distance_matrix, random)
 
-        return population
+        return tours, fitness
 
     @abstractmethod
-    def mutate(self, species: Species) -> Species:
+    def mutate(self, path: np.ndarray, dists: np.ndarray, random: np.random.Generator) -> float:
+        """Mutate the path in place, return the change of its length"""
         pass
 
+    @staticmethod
+    def _edges_length(path: np.ndarray, dists: np.ndarray, edges) -> float:
+        """Total length of the edges starting at the given positions of the path"""
+        n = len(path)
+        return sum(dists[path[k], path[(k + 1) % n]] for k in edges)
 
-class CloseSwapMutation(Mutation):
-    def mutate(self, species: Species) -> Species:
-        path = species.get_path()
-        one = random.randint(0, len(path) - 1)
-        two = (one + 1) % len(path)
 
-        path[one], path[two] = path[two], path[one]
-        species.set_path(path)
+class SwapMutation(Mutation):
+    def mutate(self, path: np.ndarray, dists: np.ndarray, random: np.random.Generator) -> float:
+        one, two = random.integers(0, len(path), size=2).tolist()
+        return self._swap(path, dists, one, two)
 
-        return species
+    def _swap(self, path: np.ndarray, dists: np.ndarray, one: int, two: int) -> float:
+        # only the edges entering and leaving both positions change
+        n = len(path)
+        edges = {(one - 1) % n, one, (two - 1) % n, two}
+        before = self._edges_length(path, dists, edges)
 
+        path[one], path[two] = path[two], path[one]
 
-class SwapMutation(Mutation):
-    def mutate(self, species: Species):
-        path = species.get_path()
-        one = random.randint(0, len(path) - 1)
-        two = random.randint(0, len(path) - 1)
+        return self._edges_length(path, dists, edges) - before
 
-        path[one], path[two] = path[two], path[one]
-        species.set_path(path)
 
-        return species
+class CloseSwapMutation(SwapMutation):
+    def mutate(self, path: np.ndarray, dists: np.ndarray, random: np.random.Generator) -> float:
+        one = int(random.integers(0, len(path)))
+        two = (one + 1) % len(path)
+        return self._swap(path, dists, one, two)
 
 
 class ScrambleMutation(Mutation):
-    def mutate(self, species: Species) -> Species:
-        path = species.get_path()
-        one = random.randint(0, len(path) - 1)
-        two = random.randint(0, len(path) - 1)
+    def mutate(self, path: np.ndarray, dists: np.ndarray, random: np.random.Generator) -> float:
+        one, two = random.integers(0, len(path), size=2).tolist()
 
         if one > two:
             one, two = two, one
+        if two - one < 2:
+            return 0.0
+
+        # edges inside the segment and the two joining it to the rest of the tour
+        positions = np.arange(one - 1, two) % len(path)
+        following = (positions + 1) % len(path)
+        before = dists[path[positions], path[following]].sum()
 
         subpath = path[one:two]
-        np.random.shuffle(subpath)
-        path[one:two] = subpath
+        random.shuffle(subpath)
 
-        species.set_path(path)
-        return species
+        return dists[path[positions], path[following]].sum() - before
 
 
 class TwoOptMutation(Mutation):
@@ -66,24 +78,36 @@ class TwoOptMutation(Mutation):
         super().__init__(mutated)
         self.k = k
 
-    def mutate(self, species: Species) -> Species:
+    def mutate(self, path: np.ndarray, dists: np.ndarray, random: np.random.Generator) -> float:
+        size = len(path)
+        delta = 0.0
         for i in range(self.k):
-            a = random.randint(0, species.size() - 1)
-            c = (a + 2 + random.randint(0, species.size() - 4)) % species.size() # cannot choose A and B
+            a = int(random.integers(0, size))
+            c = (a + 2 + int(random.integers(0, size - 3))) % size # cannot choose A and B
             if a > c:
                 a, c = c, a
 
             b = a + 1
-            d = c + 1
+            d = (c + 1) % size
 
-            path = np.copy(species.get_path())
-            path = np.append(path, path)
-            bc = path[b:c + 1]
-            ad = np.array(list(reversed(path[d:species.size() + a + 1])))
-            new_path = np.append(ad, bc)
+            # edges (A, B) and (C, D) become (A, C) and (B, D)
+            city_a, city_b, city_c, city_d = path[a], path[b], path[c], path[d]
+            delta += (dists[city_a, city_c] + dists[city_b, city_d] -
+                      dists[city_a, city_b] - dists[city_c, city_d])
+            path[b:c + 1] = path[b:c + 1][::-1]
 
-            species.set_path(new_path)
+        return delta
 
-            return species
 
+class LocalSearchMutation(Mutation):
+    """memetic operator: improves the species by a local search instead of a random change
+
+    the search stops after its max_moves moves or time_limit seconds,
+    which keeps the time of a generation bounded
+    """
+    def __init__(self, mutated: float, local_search: Optional[LocalSearch] = None):
+        super().__init__(mutated)
+        self.local_search = local_search if local_search is not None else TwoOptOrOpt(max_moves=50)
 
+    def mutate(self, path: np.ndarray, dists: np.ndarray, random: np.random.Generator) -> float:
+        return self.local_search.improve(path, dists)
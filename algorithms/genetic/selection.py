@@ -1,5 +1,4 @@
 from abc import ABC, abstractmethod
-import random
 import numpy as np
 import scipy.stats as sps
 
@@ -9,7 +8,8 @@ class Selection(ABC):
         self.survived = survived
 
     @abstractmethod
-    def select(self, population: np.array) -> np.array:
+    def select(self, fitness: np.ndarray, random: np.random.Generator) -> np.ndarray:
+        """Return indices of survived species"""
         pass
 
 
@@ -18,41 +18,28 @@ class TournamentSelection(Selection):
         super().__init__(survived)
         self.k = k
 
-    def select(self, population: np.array) -> np.array:
-        n = len(population)
-        # killed = []
-        while len(population) > self.survived * n:
-            get_sample = random.sample(list(range(len(population))), self.k)
-            max_index = max(get_sample, key=lambda x: population[x].get_fitness())
-            for index in get_sample:
-                if index != max_index:
-                    # killed.append(population[index])
-                    population = np.append(population[:index], population[index + 1:])
+    def select(self, fitness: np.ndarray, random: np.random.Generator) -> np.ndarray:
+        # every row is a tournament of k random species, the shortest tour wins
+        tournaments = random.integers(0, len(fitness), size=(int(np.ceil(len(fitness) * self.survived)), self.k))
+        winners = np.argmin(fitness[tournaments], axis=1)
 
-        return population
+        return tournaments[np.arange(len(tournaments)), winners]
 
 
 class RouletteSelection(Selection):
-    def select(self, population: np.array) -> np.array:
-        fitnesses = np.array(list(map(lambda x: x.get_fitness(), population)))
-        max_fitness = np.max(fitnesses) + 1
-        summa = np.sum(max_fitness - fitnesses)
-        probs = (max_fitness - fitnesses) / summa
+    def select(self, fitness: np.ndarray, random: np.random.Generator) -> np.ndarray:
+        max_fitness = np.max(fitness) + 1
+        summa = np.sum(max_fitness - fitness)
+        probs = (max_fitness - fitness) / summa
 
-        return np.random.choice(population, int(np.ceil(len(population) * self.survived)), p=probs)
+        return random.choice(len(fitness), int(np.ceil(len(fitness) * self.survived)), p=probs)
 
 
 class RankSelection(Selection): # TODO сверить определение
-    def select(self, population: np.array, a: float = 1) -> np.array:
-        fitnesses = np.array(list(map(lambda x: x.get_fitness(), population)))
-        order = np.argsort(fitnesses)
-        n = len(population)
+    def select(self, fitness: np.ndarray, random: np.random.Generator, a: float = 1) -> np.ndarray:
+        rank = np.argsort(np.argsort(fitness))
+        n = len(fitness)
         b = 2 - a
-        probs = (a - (a - b) * order / (n - 1)) / n
-
-        return np.random.choice(population, int(np.ceil(len(population) * self.survived)), p=probs)
-
-
-
-
+        probs = (a - (a - b) * rank / (n - 1)) / n
 
+        return random.choice(n, int(np.ceil(n * self.survived)), p=probs)
@@ -0,0 +1,116 @@
+from typing import Any, List, NamedTuple, Optional
+import numpy as np
+
+from tsp import Recorder
+
+
+class HeldKarp:
+    """Exact solver by dynamic programming over subsets of visited cities.
+
+    Like TSP.State, a state is a bit mask of visited cities together with the
+    current city. The start city is always visited, so masks range over the
+    other m = n - 1 cities and the table has shape (2 ** m, m): the length of
+    the shortest path leaving the start, visiting the cities of the mask and
+    ending in the given city. Masks with the same number of cities form a
+    layer, computed from the previous layer by a vectorized minimum.
+    """
+    class Trail(NamedTuple):
+        path: List[Any]
+        distance: float
+
+    CHUNK = 1 << 14  # Masks of a layer updated at once.
+    INDEX_BYTES = 17  # Bytes per mask taken by the index of masks ordered by size.
+
+    def __init__(self, memory_limit: int = 2 ** 30, dtype: Any = np.float64):
+        self.memory_limit = memory_limit  # Bytes the tables may take, larger instances are refused.
+        self.dtype = np.dtype(dtype)  # float32 halves the memory, the answer is recomputed exactly.
+        self.best_solution = HeldKarp.Trail([], float('inf'))
+
+    def memory(self, cities_amount: int) -> int:
+        """Bytes taken by the tables and temporaries for the given number of cities."""
+        m = max(cities_amount - 1, 0)
+        # Lengths and parents of every state.
+        tables = (1 << m) * m * (self.dtype.itemsize + 1)
+        # Masks, shifted masks and sizes while sizes are counted, or masks sorted
+        # by size together with the sort's own buffers.
+        index = (1 << m) * self.INDEX_BYTES
+        # Lengths of previous states and candidates of a chunk, plus its index arrays.
+        chunk = min(1 << m, self.CHUNK)
+        workspace = chunk * (2 * m * self.dtype.itemsize + self.dtype.itemsize + 6 * 8)
+        return tables + index + workspace
+
+    def solve(self, tsp, logging=False, recorder: Optional[Recorder] = None, start: int = 0) -> float:
+        """Find the shortest tour, return its length.
+
+        Raises ValueError when the tables need more than memory_limit bytes.
+        """
+        recorder = recorder if recorder is not None else tsp.recorder
+        n = tsp.cities_amount
+        if self.memory(n) > self.memory_limit:
+            raise ValueError(f'Held-Karp for {n} cities needs {self.memory(n)} bytes, '
+                             f'over the limit of {self.memory_limit}')
+
+        dists = np.asarray(tsp.dists(), dtype=float)
+        others = np.array([city for city in range(n) if city != start], dtype=np.int64)
+        m = len(others)
+
+        if m == 0:
+            path = [start]
+        else:
+            order = self._optimal_order(dists[np.ix_(others, others)], dists[start, others], dists[others, start])
+            path = [start] + others[order].tolist()
+
+        distance = float(sum(dists[path[i], path[(i + 1) % n]] for i in range(n)))
+        self.best_solution = HeldKarp.Trail(path + [start], distance)
+
+        if logging:
+            recorder.add_iteration(distance)
+            recorder.add_to_history(self.best_solution.path, distance)
+
+        recorder.solution = distance
+        return distance
+
+    def _optimal_order(self, dists: np.ndarray, from_start: np.ndarray, to_start: np.ndarray) -> List[int]:
+        """Order of the other cities on the shortest tour, as indices into dists."""
+        m = len(dists)
+        full = (1 << m) - 1
+        dists = dists.astype(self.dtype)
+
+        lengths = np.full((1 << m, m), np.inf, dtype=self.dtype)
+        parents = np.full((1 << m, m), -1, dtype=np.int8 if m < 128 else np.int16)
+        singles = 1 << np.arange(m)
+        lengths[singles, np.arange(m)] = from_start
+
+        # Number of cities of every mask, counted with a single buffer of shifted masks.
+        masks = np.arange(1 << m, dtype=np.int64)
+        sizes = np.zeros(1 << m, dtype=np.uint8)
+        bits = np.empty_like(masks)
+        for city in range(m):
+            np.right_shift(masks, city, out=bits)
+            np.bitwise_and(bits, 1, out=bits)
+            np.add(sizes, bits, out=sizes, casting='unsafe')
+        del masks, bits
+        # Masks ordered by size are the positions that sort the sizes.
+        masks = np.argsort(sizes, kind='stable')
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(sizes, minlength=m + 1))])
+        del sizes
+
+        for size in range(2, m + 1):
+            # Layers are taken in chunks so that temporaries stay within CHUNK masks.
+            for start in range(bounds[size], bounds[size + 1], self.CHUNK):
+                chunk = masks[start:min(start + self.CHUNK, bounds[size + 1])]
+                for last in range(m):
+                    ending = chunk[(chunk >> last) & 1 == 1]
+                    previous = ending ^ (1 << last)
+                    # States of the previous mask not ending in one of its cities stay infinite.
+                    candidates = lengths[previous] + dists[:, last]
+                    best = np.argmin(candidates, axis=1)
+                    lengths[ending, last] = candidates[np.arange(len(ending)), best]
+                    parents[ending, last] = best
+
+        last = int(np.argmin(lengths[full] + to_start.astype(self.dtype)))
+        order, mask = [], full
+        while last >= 0:
+            order.append(last)
+            mask, last = mask ^ (1 << last), int(parents[mask, last])
+        return order[::-1]
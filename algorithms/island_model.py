@@ -0,0 +1,85 @@
+from multiprocessing import Process, Queue
+from queue import Empty
+from typing import Any, Callable, List, Sequence, Tuple
+import traceback
+
+from tsp import Recorder
+
+
+def run_islands(target: Callable[..., Any], arguments: Sequence[Tuple]) -> List[Any]:
+    """Run target(index, queues, *arguments[index]) for every island in its own process.
+
+    Every island gets an inbox in queues[index] and may put into the inboxes
+    of the others. Return what the islands returned, in island order. When
+    an island raises, the other processes are stopped and a RuntimeError
+    with the island's traceback is raised. A process dying without a result
+    raises as well, so a solve never waits on an island that is gone.
+    """
+    n_islands = len(arguments)
+    queues = [Queue() for _ in range(n_islands)]
+    results = Queue()
+    processes = [Process(target=_island_main, args=(target, index, queues, results, island_arguments))
+                 for index, island_arguments in enumerate(arguments)]
+    for process in processes:
+        process.start()
+
+    collected: List[Any] = [None] * n_islands
+    pending = set(range(n_islands))
+    try:
+        while pending:
+            try:
+                index, error, result = results.get(timeout=0.1)
+            except Empty:
+                dead = [index for index in pending if processes[index].exitcode is not None]
+                if dead:
+                    # A result put just before exiting may still be on its way.
+                    try:
+                        index, error, result = results.get(timeout=1.0)
+                    except Empty:
+                        raise RuntimeError(f'Island {dead[0]} exited with code '
+                                           f'{processes[dead[0]].exitcode} without a result') from None
+                else:
+                    continue
+
+            if error is not None:
+                raise RuntimeError(f'Island {index} failed:\n{error}')
+            collected[index] = result
+            pending.discard(index)
+
+        # Tours sent to islands that already finished are never read, drain
+        # them so that their senders can exit.
+        while any(process.is_alive() for process in processes):
+            for queue in queues:
+                try:
+                    while True:
+                        queue.get_nowait()
+                except Empty:
+                    pass
+            for process in processes:
+                process.join(timeout=0.01)
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+    return collected
+
+
+def record_iterations(recorder: Recorder, iterations: Sequence[Sequence[float]]) -> None:
+    """Record the best distance over all islands after every iteration."""
+    longest = max(len(island_iterations) for island_iterations in iterations)
+    for i in range(longest):
+        recorder.add_iteration(min(island_iterations[i] for island_iterations in iterations
+                                   if i < len(island_iterations)))
+
+
+def _island_main(target: Callable[..., Any], index: int, queues: List[Queue], results: Queue,
+                 arguments: Tuple) -> None:
+    """Body of an island process, puts a result or the traceback of the failure."""
+    try:
+        result = target(index, queues, *arguments)
+    except BaseException:
+        results.put((index, traceback.format_exc(), None))
+    else:
+        results.put((index, None, result))
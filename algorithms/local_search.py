@@ -0,0 +1,223 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import List, Optional, Tuple
+import time
+import numpy as np
+
+from tsp import LazyDistances, nearest_neighbours
+
+
+class LocalSearch(ABC):
+    """Improves a tour in place by moves between a city and its nearest neighbours.
+
+    Cities whose neighbourhood gave no improving move get their don't-look bit
+    set and are not examined again until a move touches them. The search stops
+    at a local optimum or when max_moves moves are made or time_limit seconds
+    pass (zero disables a limit).
+    """
+    EPSILON = 1e-9
+
+    class Tour:
+        """Tour as a list of cities together with the position of every city in it."""
+        def __init__(self, cities: List[int], rows: List[List[float]], neighbours: List[List[int]]):
+            self.cities = cities
+            self.n = len(cities)
+            self.position = [0] * self.n
+            for index, city in enumerate(cities):
+                self.position[city] = index
+            self.rows = rows
+            self.neighbours = neighbours
+
+        def next(self, city: int) -> int:
+            return self.cities[(self.position[city] + 1) % self.n]
+
+        def prev(self, city: int) -> int:
+            return self.cities[self.position[city] - 1]
+
+        def reverse(self, first: int, last: int) -> None:
+            """Reverse the part of the tour going forward from position first to position last."""
+            length = (last - first) % self.n + 1
+            if 2 * length > self.n:
+                # Reversing the rest of the tour gives the same cycle.
+                first, last = (last + 1) % self.n, (first - 1) % self.n
+                length = self.n - length
+
+            cities, position = self.cities, self.position
+            for k in range(length // 2):
+                i, j = (first + k) % self.n, (last - k) % self.n
+                cities[i], cities[j] = cities[j], cities[i]
+                position[cities[i]] = i
+                position[cities[j]] = j
+
+        def replace(self, cities: List[int]) -> None:
+            self.cities[:] = cities
+            for index, city in enumerate(cities):
+                self.position[city] = index
+
+    def __init__(self, neighbours: int = 10, max_moves: int = 0, time_limit: float = 0.0):
+        self.neighbours = neighbours
+        self.max_moves = max_moves
+        self.time_limit = time_limit
+
+        # Last distance matrix with its rows as Python lists, lazy distances being read
+        # as they are, and its neighbour lists. Replaced as a whole so that concurrent
+        # solves never see a mix of two.
+        self._cache: Tuple[Optional[np.ndarray], List[List[float]], List[List[int]]] = (None, [], [])
+
+    def _prepare(self, dists: np.ndarray) -> Tuple[List[List[float]], List[List[int]]]:
+        cache = self._cache
+        if dists is cache[0]:
+            return cache[1], cache[2]
+
+        nearest = nearest_neighbours(dists, self.neighbours)
+        # Lazy distances are read row by row from their own cache instead of as a whole matrix.
+        rows = dists if isinstance(dists, LazyDistances) else np.asarray(dists, dtype=float).tolist()
+
+        self._cache = (dists, rows, nearest.tolist())
+        return self._cache[1], self._cache[2]
+
+    def improve(self, tour: np.ndarray, dists: np.ndarray) -> float:
+        """Improve the tour in place, return the change of its length."""
+        if len(tour) < 5:
+            return 0.0
+
+        rows, neighbour_lists = self._prepare(dists)
+        state = LocalSearch.Tour(np.asarray(tour).tolist(), rows, neighbour_lists)
+        deadline = time.perf_counter() + self.time_limit if self.time_limit > 0 else None
+
+        queue = deque(state.cities)
+        queued = [True] * state.n
+        delta = 0.0
+        moves = 0
+
+        while queue:
+            city = queue.popleft()
+            queued[city] = False
+
+            move = self._improve_city(state, city)
+            if move is None:
+                continue
+
+            gain, touched = move
+            delta += gain
+            moves += 1
+            for touched_city in touched:
+                if not queued[touched_city]:
+                    queued[touched_city] = True
+                    queue.append(touched_city)
+
+            if 0 < self.max_moves <= moves or (deadline is not None and time.perf_counter() > deadline):
+                break
+
+        tour[:] = state.cities
+        return delta
+
+    @abstractmethod
+    def _improve_city(self, tour: Tour, city: int) -> Optional[Tuple[float, List[int]]]:
+        """Apply an improving move around the city if there is one.
+
+        Return the change of tour length and the cities whose don't-look
+        bits should be cleared, or None when no move improves the tour.
+        """
+        pass
+
+
+class TwoOpt(LocalSearch):
+    """Replaces two edges by two shorter ones, reversing the part of the tour between them."""
+    def _improve_city(self, tour: LocalSearch.Tour, city: int) -> Optional[Tuple[float, List[int]]]:
+        return self._two_opt_move(tour, city)
+
+    def _two_opt_move(self, tour: LocalSearch.Tour, a: int) -> Optional[Tuple[float, List[int]]]:
+        rows = tour.rows
+        for forward in (True, False):
+            b = tour.next(a) if forward else tour.prev(a)
+            removed = rows[a][b]
+
+            for c in tour.neighbours[a]:
+                added = rows[a][c]
+                if added >= removed:
+                    # Neighbours are sorted, no closer city is left.
+                    break
+
+                d = tour.next(c) if forward else tour.prev(c)
+                if c == b or d == a:
+                    continue
+
+                gain = added + rows[b][d] - removed - rows[c][d]
+                if gain < -LocalSearch.EPSILON:
+                    if forward:
+                        tour.reverse(tour.position[b], tour.position[c])
+                    else:
+                        tour.reverse(tour.position[a], tour.position[d])
+                    return gain, [a, b, c, d]
+
+        return None
+
+
+class OrOpt(LocalSearch):
+    """Moves a segment of up to three cities next to a neighbour of one of its ends."""
+    def __init__(self, neighbours: int = 10, max_moves: int = 0, time_limit: float = 0.0,
+                 segment: int = 3):
+        super().__init__(neighbours, max_moves, time_limit)
+        self.segment = segment
+
+    def _improve_city(self, tour: LocalSearch.Tour, city: int) -> Optional[Tuple[float, List[int]]]:
+        return self._or_opt_move(tour, city)
+
+    def _or_opt_move(self, tour: LocalSearch.Tour, first: int) -> Optional[Tuple[float, List[int]]]:
+        rows = tour.rows
+        start = tour.position[first]
+
+        for length in range(1, min(self.segment, tour.n - 3) + 1):
+            segment = [tour.cities[(start + k) % tour.n] for k in range(length)]
+            last = segment[-1]
+            p, q = tour.prev(first), tour.next(last)
+
+            removed = rows[p][first] + rows[last][q] - rows[p][q]
+            if removed <= LocalSearch.EPSILON:
+                continue
+
+            for end in (first, last):
+                for c in tour.neighbours[end]:
+                    if rows[end][c] >= removed:
+                        break
+                    if c in segment:
+                        continue
+
+                    for e in (tour.next(c), tour.prev(c)):
+                        if e in segment or {c, e} == {p, q}:
+                            continue
+
+                        # Either end of the segment may be joined to c.
+                        first_to_c = rows[c][first] + rows[last][e]
+                        last_to_c = rows[c][last] + rows[first][e]
+                        gain = min(first_to_c, last_to_c) - rows[c][e] - removed
+                        if gain < -LocalSearch.EPSILON:
+                            self._move_segment(tour, segment, c, e, first_to_c <= last_to_c)
+                            return gain, [p, q, first, last, c, e]
+
+        return None
+
+    @staticmethod
+    def _move_segment(tour: LocalSearch.Tour, segment: List[int], c: int, e: int, first_to_c: bool) -> None:
+        """Put the segment between adjacent cities c and e, its first city next to c if first_to_c."""
+        after = tour.position[segment[-1]] + 1
+        rest = [tour.cities[(after + k) % tour.n] for k in range(tour.n - len(segment))]
+
+        index = rest.index(c)
+        if rest[(index + 1) % len(rest)] == e:
+            # Order c, segment, e.
+            inserted = segment if first_to_c else segment[::-1]
+            rest[index + 1:index + 1] = inserted
+        else:
+            # Order e, segment, c.
+            inserted = segment[::-1] if first_to_c else segment
+            rest[index:index] = inserted
+
+        tour.replace(rest)
+
+
+class TwoOptOrOpt(TwoOpt, OrOpt):
+    """Tries 2-opt moves first and Or-opt moves when no 2-opt move improves."""
+    def _improve_city(self, tour: LocalSearch.Tour, city: int) -> Optional[Tuple[float, List[int]]]:
+        return self._two_opt_move(tour, city) or self._or_opt_move(tour, city)
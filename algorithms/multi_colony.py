@@ -0,0 +1,91 @@
+from multiprocessing import Queue
+from typing import List, NamedTuple, Optional, Tuple
+
+from algorithms.ant import AntColony
+from algorithms.island_model import record_iterations, run_islands
+from algorithms.stopping import StoppingCriteria
+from tsp import Recorder
+
+
+class MultiColony:
+    """Island model of ant colonies running in separate processes.
+
+    Colonies form a ring. Every `exchange` iterations each colony sends its
+    best tour to the next colony and reinforces the tour received from the
+    previous one, so colonies may use different variations and settings
+    while sharing what they learn.
+    """
+    class History(NamedTuple):
+        variation: AntColony.Variation
+        distance: float
+        iterations: List[float]  # best distance of the colony after every iteration
+        stop_reason: StoppingCriteria.Reason
+
+    def __init__(self, colonies: List[Tuple[AntColony.Variation, AntColony.Settings]], exchange: int = 10):
+        self.colonies = colonies
+        self.exchange = exchange
+
+        self.best_solution = AntColony.Trail([], float('inf'))
+        self.histories: List[MultiColony.History] = []
+
+    def solve(self, tsp, logging=False, recorder: Optional[Recorder] = None) -> float:
+        """Run all colonies, return the best distance found by any of them.
+
+        Per-colony results are kept in histories, the overall ones go to the
+        given recorder or to the default recorder of the tsp.
+        """
+        recorder = recorder if recorder is not None else tsp.recorder
+        collected = run_islands(_run_colony, [(variation, settings, tsp, self.exchange)
+                                              for variation, settings in self.colonies])
+
+        self.histories = []
+        best_tour, best_distance = [], float('inf')
+        for (variation, _), (tour, distance, iterations, stop_reason) in zip(self.colonies, collected):
+            self.histories.append(MultiColony.History(variation, distance, iterations, stop_reason))
+            if distance < best_distance:
+                best_tour, best_distance = tour, distance
+
+        self.best_solution = AntColony._trail(best_tour, best_distance)
+
+        if logging:
+            record_iterations(recorder, [history.iterations for history in self.histories])
+            recorder.add_to_history(self.best_solution.path, self.best_solution.distance)
+
+        recorder.solution = self.best_solution.distance
+        return self.best_solution.distance
+
+
+def _run_colony(index: int, queues: List[Queue], variation: AntColony.Variation, settings: AntColony.Settings,
+                tsp, exchange: int) -> Tuple[List[int], float, List[float], StoppingCriteria.Reason]:
+    """Run one colony of a MultiColony inside its own process.
+
+    A colony that finishes or fails sends None, after which its successor
+    stops waiting for tours from it.
+    """
+    inbox, outbox = queues[index], queues[(index + 1) % len(queues)]
+    colony = AntColony(variation, settings)
+    predecessor_running = True
+    iterations = []
+
+    def exchange_tours(iteration: int) -> None:
+        nonlocal predecessor_running
+        iterations.append(float(colony.best_solution.distance))
+        if exchange <= 0 or iteration % exchange != 0:
+            return
+
+        best = colony.best_solution
+        outbox.put((best.path[:-1], best.distance))
+        if predecessor_running:
+            migrant = inbox.get()
+            if migrant is None:
+                predecessor_running = False
+            else:
+                colony.reinforce(AntColony._trail(*migrant))
+
+    try:
+        colony.solve(tsp, logging=False, on_iteration=exchange_tours)
+    finally:
+        outbox.put(None)
+
+    best = colony.best_solution
+    return best.path[:-1], float(best.distance), iterations, colony.stop_reason
@@ -0,0 +1,92 @@
+from multiprocessing import Pool, shared_memory
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+import numpy as np
+
+
+class SharedArray:
+    """NumPy array living in a named shared memory block.
+
+    The process that creates the array owns the block and unlinks it, other
+    processes attach to it by its descriptor and only close it.
+    """
+    def __init__(self, name: str, shape: Tuple[int, ...], dtype: str, create: bool = False):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.owner = create
+
+        size = max(int(np.prod(self.shape)) * self.dtype.itemsize, 1)
+        if create:
+            self.memory = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self.memory.buf)
+
+    @staticmethod
+    def copy_of(array: np.ndarray) -> 'SharedArray':
+        """Create a shared array holding a copy of the given array."""
+        shared = SharedArray('', array.shape, array.dtype.str, create=True)
+        shared.array[...] = array
+        return shared
+
+    @staticmethod
+    def empty(shape: Tuple[int, ...], dtype: str = 'float64') -> 'SharedArray':
+        return SharedArray('', shape, dtype, create=True)
+
+    @property
+    def descriptor(self) -> Tuple[str, Tuple[int, ...], str]:
+        """Picklable arguments to attach to the array from another process."""
+        return self.memory.name, self.shape, self.dtype.str
+
+    def close(self) -> None:
+        self.array = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+class WorkerPool:
+    """Pool of worker processes reading arrays from shared memory.
+
+    Every array is copied into a shared block once, workers attach to all of
+    them when they start and find them in worker_arrays by name, next to the
+    picklable extras. Only task arguments and results travel between
+    processes then. The pool owns its blocks, close() stops the workers and
+    frees them, and a pool failing to start frees what it already holds.
+    """
+    def __init__(self, workers: int, arrays: Dict[str, np.ndarray], extras: Dict[str, Any]):
+        self.pool = None
+        self.shared: Dict[str, SharedArray] = {}
+        try:
+            for name, array in arrays.items():
+                self.shared[name] = SharedArray.copy_of(array)
+            descriptors = {name: shared.descriptor for name, shared in self.shared.items()}
+            self.pool = Pool(workers, _attach_worker, (descriptors, extras))
+        except BaseException:
+            self.close()
+            raise
+
+    def array(self, name: str) -> np.ndarray:
+        """Shared array of the main process, changes are seen by the workers."""
+        return self.shared[name].array
+
+    def starmap(self, function: Callable, arguments: Iterable[Tuple]) -> List[Any]:
+        return self.pool.starmap(function, arguments)
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        for shared in self.shared.values():
+            shared.close()
+        self.shared = {}
+
+
+# Shared arrays and extras of the pool a worker process belongs to, attached once per worker.
+worker_arrays: Dict[str, Any] = {}
+
+
+def _attach_worker(descriptors: Dict[str, Tuple[str, Tuple[int, ...], str]], extras: Dict[str, Any]) -> None:
+    for name, descriptor in descriptors.items():
+        worker_arrays[name] = SharedArray(*descriptor)
+    worker_arrays.update(extras)
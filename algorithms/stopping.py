@@ -0,0 +1,56 @@
+from dataclasses import dataclass
+from enum import Enum, auto
+from typing import Optional
+import time
+
+
+@dataclass
+class StoppingCriteria:
+    """Conditions on which a solver returns before running all of its iterations.
+
+    A solver asks a monitor after every iteration and stops as soon as one of
+    the criteria fires. Criteria left at their defaults are disabled.
+    """
+    time_limit: float = 0.0  # Wall-clock seconds of a solve.
+    target: Optional[float] = None  # Tour length that is good enough, e.g. a known optimum.
+    stagnation: int = 0  # Iterations in a row without improvement of the best tour.
+    branching: float = 0.0  # Average lambda-branching factor of converged pheromones (ant colonies only).
+    branching_lambda: float = 0.05  # Fraction of a city's pheromone range an edge needs to count as a branch.
+
+    class Reason(Enum):
+        ITERATIONS = auto()
+        TIME_LIMIT = auto()
+        TARGET = auto()
+        STAGNATION = auto()
+        CONVERGENCE = auto()
+
+    class Monitor:
+        """Progress of one solve against the criteria."""
+        def __init__(self, criteria: 'StoppingCriteria'):
+            self.criteria = criteria
+            self.start_time = time.time()
+            self.best = float('inf')
+            self.stagnating = 0
+
+        def check(self, best: float, branching: Optional[float] = None) -> Optional['StoppingCriteria.Reason']:
+            """Register the best distance after an iteration, return the reason to stop if any."""
+            if best < self.best:
+                self.best = best
+                self.stagnating = 0
+            else:
+                self.stagnating += 1
+
+            criteria = self.criteria
+            if criteria.target is not None and self.best <= criteria.target:
+                return StoppingCriteria.Reason.TARGET
+            if 0 < criteria.stagnation <= self.stagnating:
+                return StoppingCriteria.Reason.STAGNATION
+            if branching is not None and branching <= criteria.branching:
+                return StoppingCriteria.Reason.CONVERGENCE
+            if 0 < criteria.time_limit <= time.time() - self.start_time:
+                return StoppingCriteria.Reason.TIME_LIMIT
+            return None
+
+    def monitor(self) -> Monitor:
+        """Start watching a new solve."""
+        return StoppingCriteria.Monitor(self)
@@ -0,0 +1,144 @@
+import gzip
+import os
+from typing import NamedTuple, Optional, Dict, List
+import numpy as np
+
+
+class Instance(NamedTuple):
+    name: str
+    ids: np.ndarray  # city ids, strings of the plain format or numbers of TSPLIB
+    coordinates: Optional[np.ndarray]  # (n, 2) floats, None for a matrix without display data
+    distances: Optional[np.ndarray]  # (n, n) explicit distances, None when computed from coordinates
+    edge_weight_type: Optional[str]  # TSPLIB EDGE_WEIGHT_TYPE, None for the plain format with unrounded distances
+
+
+# Edge weight types of TSPLIB which are supported, the rest are refused.
+EDGE_WEIGHT_TYPES = ('EUC_2D', 'EXPLICIT')
+
+# Sections of TSPLIB files which end the header.
+_SECTIONS = ('NODE_COORD_SECTION', 'EDGE_WEIGHT_SECTION', 'DISPLAY_DATA_SECTION',
+             'FIXED_EDGES_SECTION', 'TOUR_SECTION', 'DEMAND_SECTION', 'EOF')
+
+
+def load_instance(path: str) -> Instance:
+    """Read an instance from a file, gzip compressed or not.
+
+    Files are either TSPLIB files with a header of KEY : VALUE lines, or the
+    plain format of the tests directory with an <id x y> line for every city,
+    optionally preceded by the number of cities like the input of main.py.
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    if data[:2] == b'\x1f\x8b':
+        data = gzip.decompress(data)
+    text = data.decode('utf-8')
+
+    name = os.path.basename(path)
+    first_line = text.lstrip().split('\n', 1)[0]
+    if ':' in first_line or first_line.strip().upper() in _SECTIONS:
+        return _parse_tsplib(text, name)
+    return _parse_plain(text, name)
+
+
+def _parse_plain(text: str, name: str) -> Instance:
+    tokens = text.split()
+    if len(tokens) % 3 == 1:
+        # The number of cities comes first.
+        count, tokens = int(tokens[0]), tokens[1:]
+        if 3 * count != len(tokens):
+            raise ValueError(f'{name}: expected {count} cities, found {len(tokens) // 3}')
+    if len(tokens) % 3 != 0:
+        raise ValueError(f'{name}: every line must have the form <id x y>')
+
+    # Numbers convert much faster from a list of strings than from a string array.
+    ids = np.array(tokens[0::3])
+    del tokens[0::3]
+    return Instance(name, ids, np.array(tokens, dtype=float).reshape(-1, 2), None, None)
+
+
+def _parse_tsplib(text: str, name: str) -> Instance:
+    header: Dict[str, str] = {}
+    sections: Dict[str, List[str]] = {}
+    current: Optional[List[str]] = None
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            continue
+        keyword = stripped.split(':', 1)[0].strip().upper()
+        if keyword in _SECTIONS:
+            if keyword == 'EOF':
+                break
+            current = sections.setdefault(keyword, [])
+            # Numbers may follow the keyword on the same line.
+            rest = stripped[len(keyword):].lstrip(' :')
+            if rest:
+                current.append(rest)
+        elif current is None:
+            key, _, value = stripped.partition(':')
+            header[key.strip().upper()] = value.strip()
+        else:
+            current.append(stripped)
+
+    name = header.get('NAME', name)
+    kind = header.get('TYPE', 'TSP').split()[0].upper()
+    if kind != 'TSP':
+        raise ValueError(f'{name}: instances of type {kind} are not supported')
+    edge_weight_type = header.get('EDGE_WEIGHT_TYPE', 'EUC_2D').upper()
+    if edge_weight_type not in EDGE_WEIGHT_TYPES:
+        raise ValueError(f'{name}: edge weight type {edge_weight_type} is not supported')
+
+    coordinates, ids = None, None
+    for section in ('NODE_COORD_SECTION', 'DISPLAY_DATA_SECTION'):
+        if section in sections:
+            table = np.array(' '.join(sections[section]).split(), dtype=float)
+            if len(table) % 3 != 0:
+                raise ValueError(f'{name}: {section} must have the form <id x y> on every line')
+            table = table.reshape(-1, 3)
+            ids = table[:, 0].astype(np.int64)
+            coordinates = table[:, 1:]
+            break
+
+    distances = None
+    if edge_weight_type == 'EXPLICIT':
+        if 'EDGE_WEIGHT_SECTION' not in sections:
+            raise ValueError(f'{name}: EXPLICIT edge weights need an EDGE_WEIGHT_SECTION')
+        dimension = int(header['DIMENSION'])
+        weights = np.array(' '.join(sections['EDGE_WEIGHT_SECTION']).split(), dtype=float)
+        distances = _explicit_matrix(weights, dimension, header.get('EDGE_WEIGHT_FORMAT', 'FULL_MATRIX').upper(), name)
+    elif coordinates is None:
+        raise ValueError(f'{name}: {edge_weight_type} edge weights need a NODE_COORD_SECTION')
+
+    n = len(distances) if distances is not None else len(coordinates)
+    if 'DIMENSION' in header and int(header['DIMENSION']) != n:
+        raise ValueError(f'{name}: DIMENSION is {header["DIMENSION"]}, found {n} cities')
+    if ids is None:
+        ids = np.arange(1, n + 1)
+    return Instance(name, ids, coordinates, distances, edge_weight_type)
+
+
+def _explicit_matrix(weights: np.ndarray, n: int, weight_format: str, name: str) -> np.ndarray:
+    """Symmetric distance matrix from the numbers of an EDGE_WEIGHT_SECTION."""
+    if weight_format == 'FULL_MATRIX':
+        if len(weights) != n * n:
+            raise ValueError(f'{name}: FULL_MATRIX of {n} cities needs {n * n} numbers, found {len(weights)}')
+        return weights.reshape(n, n)
+
+    # Row formats of one triangle, a column format of a triangle is the row
+    # format of the other one.
+    formats = {
+        'UPPER_ROW': (np.triu_indices, 1), 'LOWER_ROW': (np.tril_indices, -1),
+        'UPPER_DIAG_ROW': (np.triu_indices, 0), 'LOWER_DIAG_ROW': (np.tril_indices, 0),
+        'UPPER_COL': (np.tril_indices, -1), 'LOWER_COL': (np.triu_indices, 1),
+        'UPPER_DIAG_COL': (np.tril_indices, 0), 'LOWER_DIAG_COL': (np.triu_indices, 0),
+    }
+    if weight_format not in formats:
+        raise ValueError(f'{name}: edge weight format {weight_format} is not supported')
+    triangle, offset = formats[weight_format]
+    rows, columns = triangle(n, offset)
+    if len(weights) != len(rows):
+        raise ValueError(f'{name}: {weight_format} of {n} cities needs {len(rows)} numbers, found {len(weights)}')
+
+    matrix = np.zeros((n, n))
+    matrix[rows, columns] = weights
+    matrix[columns, rows] = weights
+    return matrix
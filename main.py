@@ -1,13 +1,16 @@
 from algorithms.ant import AntColony
 from tsp import TSP
 from algorithms.loop import LoopSolution
+from algorithms.held_karp import HeldKarp
+from algorithms.branch_and_bound import BranchAndBound
 from typing import List
+import sys
 
 from algorithms.genetic.genetic import GeneticAlgorithm
 from algorithms.genetic.creation import RandomCreation
 from algorithms.genetic.selection import TournamentSelection, RouletteSelection, RankSelection
 from algorithms.genetic.crossover import InbreedingParentGenerator, OutbreedingParentGenerator, PanmixiaParentGenerator, OrderCrossover, EdgeRecombinationCrossover
-from algorithms.genetic.mutation import SwapMutation, ScrambleMutation, TwoOptMutation
+from algorithms.genetic.mutation import SwapMutation, ScrambleMutation, TwoOptMutation, LocalSearchMutation
 
 def choose_ants(tsp: TSP):
     print("""Типы алгоритмов:
@@ -108,7 +111,8 @@ def choose_genetic(tsp: TSP):
         print("""Mutation:
                     1 - Swap
                     2 - Scramble
-                    3 - 2-opt""")
+                    3 - 2-opt
+                    4 - 2-opt и Or-opt локальный поиск""")
 
         type = int(input("Мой выбор: "))
 
@@ -118,6 +122,8 @@ def choose_genetic(tsp: TSP):
             mutation = ScrambleMutation(mutated)
         elif type == 3:
             mutation = TwoOptMutation(mutated)
+        elif type == 4:
+            mutation = LocalSearchMutation(mutated)
 
     ga_settings = GeneticAlgorithm.Settings(survived=survived, mutated=mutated, iterations=iterations,
                                             creation=RandomCreation(population_size),
@@ -131,20 +137,27 @@ def choose_genetic(tsp: TSP):
 
 
 if __name__ == '__main__':
-    n = int(input("Количество городов: "))
+    if len(sys.argv) > 1:
+        # Instance file of the tests directory or of TSPLIB.
+        tsp = TSP.from_file(sys.argv[1])
+        n = tsp.cities_amount
+    else:
+        n = int(input("Количество городов: "))
 
-    print('Введите города в формате <id x y>')
-    cities: List[TSP.City] = []
-    for i in range(n):
-        id, x, y = input().split()
-        cities.append(TSP.City(id, int(x), int(y)))
+        print('Введите города в формате <id x y>')
+        cities: List[TSP.City] = []
+        for i in range(n):
+            id, x, y = input().split()
+            cities.append(TSP.City(id, int(x), int(y)))
 
-    tsp = TSP(cities)
+        tsp = TSP(cities)
 
     print("""Типы алгоритмов:
         0 - обычный перебор
         1 - Ant System
-        2 - Генетический алгоритм""")
+        2 - Генетический алгоритм
+        3 - Хелд-Карп (точное решение)
+        4 - Метод ветвей и границ (точное решение)""")
 
     type = int(input("Мой выбор: "))
 
@@ -157,6 +170,13 @@ if __name__ == '__main__':
         choose_ants(tsp)
     elif type == 2:
         choose_genetic(tsp)
+    elif type == 3:
+        dist = HeldKarp().solve(tsp)
+        print("Held-Karp: ", dist)
+    elif type == 4:
+        bnb = BranchAndBound()
+        dist = bnb.solve(tsp)
+        print("Branch and bound: ", dist, "nodes:", bnb.nodes, "gap:", bnb.gap)
 
 
 
@@ -1,90 +1,35 @@
+import hashlib
 import math
-from typing import NamedTuple, List, Tuple, Dict, Any
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, List, Tuple, Dict, Any, Optional, Sequence, Union
 import numpy as np
-from scipy.spatial import distance_matrix
+from scipy.spatial import cKDTree, distance_matrix, minkowski_distance
 from multipledispatch import dispatch
 import time
 
-class TSP:
-    class City(NamedTuple):
-        id: str
-        x: float
-        y: float
+from loader import load_instance
 
-    class State(NamedTuple):
-        visited: int  # bit mask of visited nodes
-        current_node: int
+class Recorder:
+    """Results of one solve of a TSP: distances by iteration, history of paths and the answer.
 
-    def __init__(self, cities: List[City]):
-        self._solution = 0
+    A TSP only holds the problem, so concurrent solves of the same TSP stay
+    independent as long as each of them records into its own Recorder.
+    """
+    def __init__(self, cities: List['TSP.City']):
         self.cities = cities
-        self.dist_in_iterations = []
-        self.timestamps_in_iterations = []
-        self.solutions_history = []
-        self.ants_dists = []
-        self.start_time = time.time()
-
-        cities_coords = np.array([[c.x, c.y] for c in self.cities])
-        self.distance_matrix = distance_matrix(cities_coords, cities_coords)
+        self.clear()
 
-    def clear_answer(self):
-        self.solution = 0
+    def clear(self):
+        self._solution = 0
         self.dist_in_iterations = []
+        self.timestamps_in_iterations = []
         self.solutions_history = []
         self.ants_dists = []
-        self.timestamps_in_iterations = []
         self.start_time = time.time()
 
-    @property
-    def cities_amount(self):
-        return len(self.cities)
-
-    def successors(self, current_state: State, final_state: State) -> List[Tuple[State, float]]:
-        """Successor function.
-
-        Given the state we check which nodes have not been visited and add them.
-        When all nodes have been visited, we must come back to the starting node.
-        """
-        ret: List[Tuple[TSP.State, float]] = []
-
-        for next_node in range(len(self.cities)):
-            new_state = TSP.State(1 << next_node | int(current_state.visited), next_node)
-
-            if current_state.visited != new_state.visited:
-                ret.append((new_state, self.dist(current_state.current_node, next_node)))
-
-        if len(ret) == 0:
-            # We must return now.
-            return [(TSP.State(current_state.visited, final_state.current_node),
-                     self.dist(current_state.current_node, final_state.current_node))]
-
-        return ret
-
-    def goal(self, current_state: State, final_state: State) -> bool:
-        """Determine whether the current state is a goal state.
-
-        We are in a goal state if every node has been visited, and we are
-        back at the starting node. Since we are representing the visited nodes
-        with bits, this is equivalent to all bits set.
-        """
-        goal = (1 << len(self.cities)) - 1
-        return current_state.visited == goal and current_state.current_node == final_state.current_node
-
-    def dist(self, u: int, v: int) -> float:
-        """Euclidean distance between cities."""
-        return self.distance_matrix[u][v]
-
-    def dists(self):
-        """Get distance matrix"""
-        return self.distance_matrix
-
-    def cities_to_dict(self) -> Dict:
-        """Get cities for TSP problem as dict"""
-        cities_dict = {}
-        for city in self.cities:
-            cities_dict[str(city.id)] = [city.x, city.y]
-        return cities_dict
-
     @dispatch(float)
     def add_ant_distance(self, dist: float):
         """Ant distance saving function
@@ -122,15 +67,15 @@ class TSP:
         """Return timestamps for iterations"""
         return self.timestamps_in_iterations
 
-    def add_to_history(self, path: List, dist: float) -> None:
+    def add_to_history(self, path: List[int], dist: float) -> None:
         """History saving function
 
         Each time after finding a more optimal path, this function can be called
         to add better solution (path and distance) to the list of history.
-        Note that path is saved as id for cities list """
+        Note that path is given as indices in cities list """
         current_solution = []
-        for state in path:
-            current_solution.append(self.cities[state.current_node])
+        for node in path:
+            current_solution.append(self.cities[node])
         generation = {
             'path': current_solution,
             'distance': dist
@@ -163,8 +108,350 @@ class TSP:
     def solution(self, result):
         self._solution = result
 
+
+class LazyDistances:
+    """Euclidean distances between cities computed from their coordinates on demand.
+
+    Indexing works like on the dense distance matrix: dists[u, v] is a
+    distance, dists[u] a row and dists[us, vs] the distances of pairs given by
+    two index arrays. Rows are kept in a least recently used cache of
+    cache_rows rows, nearest neighbours come from a k-d tree. Algorithms
+    needing the whole matrix get it by np.asarray(dists). Distances are
+    converted to dtype like those of the dense matrix, see compact_distances.
+    """
+    def __init__(self, coordinates: np.ndarray, cache_rows: int = 1024, dtype: Any = np.float64):
+        self.coordinates = coordinates
+        self.shape = (len(coordinates), len(coordinates))
+        self.dtype = np.dtype(dtype)
+        self.ndim = 2
+        self.cache_rows = cache_rows
+        self._rows: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._tree = None
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __getstate__(self):
+        # Caches are rebuilt by every process instead of being copied.
+        return {'coordinates': self.coordinates, 'cache_rows': self.cache_rows, 'dtype': self.dtype}
+
+    def __setstate__(self, state):
+        self.__init__(state['coordinates'], state['cache_rows'], state['dtype'])
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        matrix = compact_distances(distance_matrix(self.coordinates, self.coordinates), self.dtype)
+        return matrix if dtype is None else matrix.astype(dtype)
+
+    def row(self, city: int) -> np.ndarray:
+        """Distances from the city to all cities, read only."""
+        city = int(city)
+        with self._lock:
+            row = self._rows.get(city)
+            if row is not None:
+                self._rows.move_to_end(city)
+                return row
+
+        row = compact_distances(minkowski_distance(self.coordinates[city], self.coordinates), self.dtype)
+        row.flags.writeable = False
+        with self._lock:
+            self._rows[city] = row
+            if len(self._rows) > self.cache_rows:
+                self._rows.popitem(last=False)
+        return row
+
+    def __getitem__(self, key) -> Union[float, np.ndarray]:
+        if not isinstance(key, tuple):
+            return self.row(key)
+
+        rows, columns = key
+        if np.ndim(rows) == 0 and not isinstance(rows, slice):
+            return self.row(rows)[columns]
+        if np.ndim(columns) == 0 and not isinstance(columns, slice):
+            return self.row(columns)[rows]
+
+        n = len(self)
+        if isinstance(rows, slice) or isinstance(columns, slice):
+            # A block of the matrix.
+            rows = np.arange(n)[rows] if isinstance(rows, slice) else np.asarray(rows)
+            columns = np.arange(n)[columns] if isinstance(columns, slice) else np.asarray(columns)
+            return compact_distances(distance_matrix(self.coordinates[rows], self.coordinates[columns]), self.dtype)
+        # Pairs of cities, like fancy indexing of an array.
+        pairs = minkowski_distance(self.coordinates[np.asarray(rows)], self.coordinates[np.asarray(columns)])
+        return compact_distances(pairs, self.dtype)
+
+    def nearest(self, k: int) -> np.ndarray:
+        """Indices of the k closest other cities of every city, closest first."""
+        if self._tree is None:
+            self._tree = cKDTree(self.coordinates)
+        k = min(k, len(self) - 1)
+        _, found = self._tree.query(self.coordinates, k=k + 1)
+        found = found.reshape(len(self), k + 1)
+        # Cities at equal positions may come before the city itself.
+        own = found == np.arange(len(self))[:, None]
+        own[:, -1] |= ~own.any(axis=1)
+        return found[~own].reshape(len(self), k)
+
+
+class Cities(Sequence):
+    """Cities given by arrays of ids and coordinates, a TSP.City is made only when asked for.
+
+    Instances loaded from files may have many cities, making a tuple for each
+    of them costs more than reading the whole file. Without coordinates, as
+    for an explicit distance matrix, cities have nan coordinates.
+    """
+    def __init__(self, ids: np.ndarray, coordinates: Optional[np.ndarray]):
+        self.ids = ids
+        self.coordinates = coordinates
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if self.coordinates is None:
+            return TSP.City(str(self.ids[index]), math.nan, math.nan)
+        x, y = self.coordinates[index]
+        return TSP.City(str(self.ids[index]), float(x), float(y))
+
+
+class TSP:
+    class City(NamedTuple):
+        id: str
+        x: float
+        y: float
+
+    class State(NamedTuple):
+        visited: int  # bit mask of visited nodes
+        current_node: int
+
+    # Share of available memory a dense distance matrix may take when the backend is chosen automatically.
+    DENSE_MEMORY_SHARE = 0.25
+
+    def __init__(self, cities: Sequence[City], distances: Union[str, np.ndarray] = 'auto', cache_rows: int = 1024,
+                 dtype: Any = np.float64, cache_dir: Optional[str] = None):
+        """distances is 'dense' for the full matrix, 'lazy' for distances computed
+        on demand, 'auto' to pick dense when it fits comfortably into memory or
+        a matrix of distances given explicitly.
+
+        dtype of distances may be float32 or an integer type, the latter
+        rounded to the nearest integer like EUC_2D distances of TSPLIB. With
+        cache_dir a dense matrix computed from coordinates is saved there once
+        and memory mapped by every TSP of the same cities, so processes share
+        one copy of it.
+        """
+        self.cities = cities
+        # results of solves which are not given a recorder of their own
+        self.recorder = Recorder(cities)
+
+        if isinstance(cities, Cities):
+            self.coordinates = cities.coordinates
+        else:
+            self.coordinates = np.array([[c.x, c.y] for c in self.cities], dtype=float).reshape(-1, 2)
+        self.dtype = np.dtype(dtype)
+        self._cache_path: Optional[str] = None
+        if not isinstance(distances, str):
+            self.distance_matrix = compact_distances(np.asarray(distances, dtype=float), self.dtype)
+            distances = 'explicit'
+        elif self.coordinates is None:
+            raise ValueError('Distances of cities without coordinates must be given explicitly')
+        if distances == 'auto':
+            dense_bytes = self.dtype.itemsize * len(self.cities) ** 2
+            distances = 'dense' if dense_bytes <= self.DENSE_MEMORY_SHARE * _available_memory() else 'lazy'
+        if distances == 'dense' and cache_dir is not None:
+            self._cache_path = _cached_distances(self.coordinates, self.dtype, cache_dir)
+            self.distance_matrix = np.load(self._cache_path, mmap_mode='r')
+        elif distances == 'dense':
+            self.distance_matrix = compact_distances(distance_matrix(self.coordinates, self.coordinates), self.dtype)
+        elif distances == 'lazy':
+            self.distance_matrix = LazyDistances(self.coordinates, cache_rows, self.dtype)
+        elif distances != 'explicit':
+            raise ValueError(f'Unknown distances backend {distances}')
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self._cache_path is not None:
+            # Other processes map the cached file instead of receiving a copy of the matrix.
+            state['distance_matrix'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self._cache_path is not None:
+            self.distance_matrix = np.load(self._cache_path, mmap_mode='r')
+
+    @classmethod
+    def from_array(cls, coordinates: np.ndarray, ids: Optional[np.ndarray] = None, **kwargs) -> 'TSP':
+        """Create a TSP of cities given by an (n, 2) array of coordinates, numbered from 1 without ids"""
+        coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+        if ids is None:
+            ids = np.arange(1, len(coordinates) + 1)
+        return cls(Cities(np.asarray(ids), coordinates), **kwargs)
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> 'TSP':
+        """Create a TSP from a file of the tests directory or a TSPLIB file, gzip compressed or not.
+
+        Distances of TSPLIB EUC_2D instances are rounded to integers unless
+        another dtype is given, so that lengths match the published ones.
+        """
+        instance = load_instance(path)
+        if instance.distances is not None:
+            kwargs['distances'] = instance.distances
+        elif instance.edge_weight_type == 'EUC_2D':
+            kwargs.setdefault('dtype', np.int32)
+        return cls(Cities(instance.ids, instance.coordinates), **kwargs)
+
+    def new_recorder(self) -> Recorder:
+        """Create a recorder for the results of a separate solve"""
+        return Recorder(self.cities)
+
+    def clear_answer(self):
+        self.recorder.clear()
+
+    @property
+    def cities_amount(self):
+        return len(self.cities)
+
+    def unvisited(self, current_node: int, visited: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Successor function for heuristic solvers.
+
+        visited is a boolean array over cities which the caller reuses for a
+        whole tour. Return the indices of unvisited cities and the distance row
+        of the current node, the latter being a view of the distance matrix.
+        No state is allocated per city.
+        """
+        return np.flatnonzero(~visited), self.distance_matrix[current_node]
+
+    def dist(self, u: int, v: int) -> float:
+        """Euclidean distance between cities."""
+        return self.distance_matrix[u, v]
+
+    def dists(self):
+        """Get distance matrix, a dense array or LazyDistances indexed the same way"""
+        return self.distance_matrix
+
+    @property
+    def lazy(self) -> bool:
+        return isinstance(self.distance_matrix, LazyDistances)
+
+    def nearest_neighbours(self, k: int) -> np.ndarray:
+        """Indices of the k closest other cities of every city, closest first"""
+        return nearest_neighbours(self.distance_matrix, k)
+
+    def cities_to_dict(self) -> Dict:
+        """Get cities for TSP problem as dict"""
+        cities_dict = {}
+        for city in self.cities:
+            cities_dict[str(city.id)] = [city.x, city.y]
+        return cities_dict
+
     def path_length(self, path) -> float:
-        length = 0
+        length = 0.0
         for i in range(len(path)):
-            length += self.dist(path[i], path[(i + 1) % len(path)])
+            length += float(self.dist(path[i], path[(i + 1) % len(path)]))
         return length
+
+    def path_lengths(self, paths: np.ndarray) -> np.ndarray:
+        """Lengths of closed paths given as rows of a matrix of city indices"""
+        return self.distance_matrix[paths, np.roll(paths, -1, axis=-1)].sum(axis=-1, dtype=float)
+
+    # Results of solves recorded into the default recorder.
+
+    def add_ant_distance(self, *args):
+        self.recorder.add_ant_distance(*args)
+
+    def get_ants_distances(self):
+        return self.recorder.get_ants_distances()
+
+    def add_iteration(self, dist: float) -> None:
+        self.recorder.add_iteration(dist)
+
+    def get_iterations(self) -> List[float]:
+        return self.recorder.get_iterations()
+
+    def get_timestamps(self) -> List[float]:
+        return self.recorder.get_timestamps()
+
+    def add_to_history(self, path: List[int], dist: float) -> None:
+        self.recorder.add_to_history(path, dist)
+
+    def get_solutions_history(self) -> Tuple[List[List[List[int]]], List[float]]:
+        return self.recorder.get_solutions_history()
+
+    def answer_path(self) -> List[Any]:
+        return self.recorder.answer_path()
+
+    @property
+    def solution(self) -> float:
+        return self.recorder.solution
+
+    @solution.setter
+    def solution(self, result):
+        self.recorder.solution = result
+
+
+def _available_memory() -> int:
+    """Bytes of memory available to the process, a conservative guess if unknown"""
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except ImportError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return 2 ** 31
+
+
+def nearest_neighbours(dists: Union[np.ndarray, LazyDistances], k: int) -> np.ndarray:
+    """Indices of the k closest other cities of every city, closest first.
+
+    Lazy distances answer from their k-d tree without building the matrix.
+    """
+    if isinstance(dists, LazyDistances):
+        return dists.nearest(k)
+    dists = np.array(dists, dtype=float)
+    np.fill_diagonal(dists, np.inf)
+    k = min(k, len(dists) - 1)
+    if k <= 0:
+        return np.empty((len(dists), 0), dtype=np.int64)
+    nearest = np.argpartition(dists, k - 1, axis=1)[:, :k]
+    order = np.argsort(np.take_along_axis(dists, nearest, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(nearest, order, axis=1)
+
+
+def compact_distances(distances: np.ndarray, dtype: Any) -> np.ndarray:
+    """Convert Euclidean distances to dtype, integer types are rounded like nint of TSPLIB"""
+    dtype = np.dtype(dtype)
+    if dtype.kind in 'iu':
+        return np.floor(distances + 0.5).astype(dtype)
+    return distances.astype(dtype, copy=False)
+
+
+def _cached_distances(coordinates: np.ndarray, dtype: np.dtype, cache_dir: str) -> str:
+    """Path of the file in cache_dir with the distance matrix of the coordinates, created if missing.
+
+    Files are named by a hash of the coordinates and the dtype, so changed
+    cities never get a stale matrix. A new file is written under a temporary
+    name and renamed, processes filling the cache at once never read a part.
+    """
+    key = hashlib.sha256()
+    key.update(np.ascontiguousarray(coordinates, dtype=float).tobytes())
+    key.update(dtype.str.encode())
+    path = os.path.join(cache_dir, f'distances-{key.hexdigest()[:32]}.npy')
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    matrix = compact_distances(distance_matrix(coordinates, coordinates), dtype)
+    handle, temporary = tempfile.mkstemp(suffix='.npy', dir=cache_dir)
+    try:
+        with os.fdopen(handle, 'wb') as file:
+            np.save(file, matrix)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    return path